@@ -1,37 +1,67 @@
-import os
+import csv
 
-# Define the accession and paths directly in the script
+# Genomes to process, in order of preference:
+#   --config samples=samples.tsv            (tab-separated sheet with an 'accession' column)
+#   --config accessions=GCF_A,GCF_B         (comma-separated list, or a YAML list in a configfile)
+#   --config accession=GCF_XXXXXX           (a single genome)
+def get_accessions():
+    if config.get("samples"):
+        with open(config["samples"]) as handle:
+            return [row["accession"].strip() for row in csv.DictReader(handle, delimiter="\t")
+                    if row.get("accession", "").strip()]
+    accessions = config.get("accessions", config.get("accession", ""))
+    if isinstance(accessions, str):
+        accessions = accessions.split(",")
+    return [accession.strip() for accession in accessions if accession.strip()]
 
-# Get single accession from config
-GENOME_ACCESSION = config.get("accession", "")
-if not GENOME_ACCESSION:
-    raise ValueError("Please provide a genome accession using --config accession=GCF_XXXXXX")
+GENOME_ACCESSIONS = get_accessions()
+if not GENOME_ACCESSIONS:
+    raise ValueError("Please provide genome accessions using --config samples=samples.tsv, "
+                     "accessions=GCF_A,GCF_B or accession=GCF_XXXXXX")
 
 
 BAKTA_DB = "/data/fast/core/bakta/db"
 SALMONELLA_PANGENOME = "/data/fast/salmonella/isangi/pseudogenes/2024.10.03/uniref_taxonomy_id_28901_NOT_name_fr_2024_10_03.fasta"
 OUTPUT_BASE = "/data/fast/salmonella/isangi/pseudogenes/2024.10.29"
+DATABASE_DIR = f"{OUTPUT_BASE}/databases"
+
+# Per-rule threads and memory; override with e.g. --config threads_bakta=16 mem_mb_bakta=32000
+def rule_threads(rule_name, default):
+    return int(config.get(f"threads_{rule_name}", default))
+
+def rule_mem_mb(rule_name, default):
+    return int(config.get(f"mem_mb_{rule_name}", default))
+
+wildcard_constraints:
+    accession = "[^/]+"
 
 rule all:
     input:
-        expand(f"{OUTPUT_BASE}/{{accession}}/{{accession}}_bakta_db_pseudos.gff", accession=GENOME_ACCESSION),
-        expand(f"{OUTPUT_BASE}/{{accession}}/{{accession}}_salmonella_pseudos.gff", accession=GENOME_ACCESSION),
-        expand(f"{OUTPUT_BASE}/{{accession}}/{{accession}}_ncbi_pseudos.gff", accession=GENOME_ACCESSION)
+        expand(f"{OUTPUT_BASE}/{{accession}}/{{accession}}_bakta_db_pseudos.gff", accession=GENOME_ACCESSIONS),
+        expand(f"{OUTPUT_BASE}/{{accession}}/{{accession}}_salmonella_pseudos.gff", accession=GENOME_ACCESSIONS),
+        expand(f"{OUTPUT_BASE}/{{accession}}/{{accession}}_ncbi_pseudos.gff", accession=GENOME_ACCESSIONS)
 
 rule download_genome:
     output:
         fasta = f"{OUTPUT_BASE}/{{accession}}/raw_data/{{accession}}.fasta",
         protein = f"{OUTPUT_BASE}/{{accession}}/raw_data/{{accession}}_protein.faa",
         gff = f"{OUTPUT_BASE}/{{accession}}/raw_data/{{accession}}.gff"
+    params:
+        download_dir = f"{OUTPUT_BASE}/{{accession}}/raw_data/download"
     conda:
         "/home/phil/envs/ncbi_datasets.yaml"
+    threads: 1
+    resources:
+        mem_mb = rule_mem_mb("download", 1000)
     shell:
         """
-        datasets download genome accession {wildcards.accession} --include genome,protein,gff3 --filename {wildcards.accession}.zip
-        unzip {wildcards.accession}.zip -d {wildcards.accession}
-        mv {wildcards.accession}/ncbi_dataset/data/{wildcards.accession}/*.fna {output.fasta}
-        mv {wildcards.accession}/ncbi_dataset/data/{wildcards.accession}/protein.faa {output.protein}
-        mv {wildcards.accession}/ncbi_dataset/data/{wildcards.accession}/*.gff {output.gff}
+        rm -rf {params.download_dir} && mkdir -p {params.download_dir}
+        datasets download genome accession {wildcards.accession} --include genome,protein,gff3 --filename {params.download_dir}/{wildcards.accession}.zip
+        unzip {params.download_dir}/{wildcards.accession}.zip -d {params.download_dir}
+        mv {params.download_dir}/ncbi_dataset/data/{wildcards.accession}/*.fna {output.fasta}
+        mv {params.download_dir}/ncbi_dataset/data/{wildcards.accession}/protein.faa {output.protein}
+        mv {params.download_dir}/ncbi_dataset/data/{wildcards.accession}/*.gff {output.gff}
+        rm -rf {params.download_dir}
         """
 
 rule annotate_bakta:
@@ -41,13 +71,50 @@ rule annotate_bakta:
         gff = f"{OUTPUT_BASE}/{{accession}}/bakta_output/{{accession}}.gbff"
     conda:
         "/home/phil/envs/bakta.yaml"
-    threads: 32
+    threads: rule_threads("bakta", 32)
+    resources:
+        mem_mb = rule_mem_mb("bakta", 16000)
     shell:
         """
         bakta --db {BAKTA_DB} --threads {threads} --output {OUTPUT_BASE}/{wildcards.accession}/bakta_output \
         --prefix {wildcards.accession} --force {input.fasta}
         """
 
+# DIAMOND databases are built once by their own rules and passed to Pseudofinder
+# with -skpdb. Left to Pseudofinder, every genome's run would rebuild the
+# pangenome database next to the shared FASTA, racing with the other genomes.
+rule diamond_db_salmonella_pangenome:
+    input:
+        fasta = SALMONELLA_PANGENOME
+    output:
+        db = f"{DATABASE_DIR}/salmonella_pangenome.dmnd"
+    conda:
+        "/home/phil/envs/pseudofinder.yaml"
+    threads: rule_threads("makedb", 8)
+    resources:
+        mem_mb = rule_mem_mb("makedb", 8000)
+    shell:
+        """
+        diamond makedb --in {input.fasta} --db {output.db} --threads {threads}
+        """
+
+rule diamond_db_ncbi_proteins:
+    input:
+        protein = f"{OUTPUT_BASE}/{{accession}}/raw_data/{{accession}}_protein.faa"
+    output:
+        db = f"{OUTPUT_BASE}/{{accession}}/raw_data/{{accession}}_protein.dmnd"
+    conda:
+        "/home/phil/envs/pseudofinder.yaml"
+    threads: rule_threads("makedb_ncbi", 2)
+    resources:
+        mem_mb = rule_mem_mb("makedb_ncbi", 2000)
+    shell:
+        """
+        diamond makedb --in {input.protein} --db {output.db} --threads {threads}
+        """
+
+# Pseudofinder annotate has no option to reuse its ORF/intergenic extraction
+# between databases, so that step still runs once per database.
 rule run_pseudofinder_bakta_db:
     input:
         gff = rules.annotate_bakta.output.gff
@@ -55,7 +122,9 @@ rule run_pseudofinder_bakta_db:
         gff = f"{OUTPUT_BASE}/{{accession}}/{{accession}}_bakta_db_pseudos.gff"
     conda:
         "/home/phil/envs/pseudofinder.yaml"
-    threads: 8
+    threads: rule_threads("pseudofinder", 8)
+    resources:
+        mem_mb = rule_mem_mb("pseudofinder", 8000)
     shell:
         """
         python ~/programs/pseudofinder/pseudofinder.py annotate -g {input.gff} \
@@ -65,32 +134,36 @@ rule run_pseudofinder_bakta_db:
 
 rule run_pseudofinder_salmonella:
     input:
-        gff = rules.annotate_bakta.output.gff
+        gff = rules.annotate_bakta.output.gff,
+        db = rules.diamond_db_salmonella_pangenome.output.db
     output:
         gff = f"{OUTPUT_BASE}/{{accession}}/{{accession}}_salmonella_pseudos.gff"
     conda:
         "/home/phil/envs/pseudofinder.yaml"
-    threads: 8
+    threads: rule_threads("pseudofinder", 8)
+    resources:
+        mem_mb = rule_mem_mb("pseudofinder", 8000)
     shell:
         """
         python ~/programs/pseudofinder/pseudofinder.py annotate -g {input.gff} \
         --outprefix {OUTPUT_BASE}/{wildcards.accession}/{wildcards.accession}_salmonella \
-        --database {SALMONELLA_PANGENOME} -di -t {threads}
+        --database {input.db} -di -skpdb -t {threads}
         """
 
 rule run_pseudofinder_ncbi:
     input:
         gff = rules.annotate_bakta.output.gff,
-        protein = f"{OUTPUT_BASE}/{{accession}}/raw_data/{{accession}}_protein.faa"
+        db = rules.diamond_db_ncbi_proteins.output.db
     output:
         gff = f"{OUTPUT_BASE}/{{accession}}/{{accession}}_ncbi_pseudos.gff"
     conda:
         "/home/phil/envs/pseudofinder.yaml"
-    threads: 8
+    threads: rule_threads("pseudofinder", 8)
+    resources:
+        mem_mb = rule_mem_mb("pseudofinder", 8000)
     shell:
         """
         python ~/programs/pseudofinder/pseudofinder.py annotate -g {input.gff} \
         --outprefix {OUTPUT_BASE}/{wildcards.accession}/{wildcards.accession}_ncbi \
-        --database {input.protein} -di -t {threads}
+        --database {input.db} -di -skpdb -t {threads}
         """
-
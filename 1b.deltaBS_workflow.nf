@@ -4,13 +4,28 @@
 nextflow.enable.dsl = 2
 
 // Process to run deltaBS.pl in Docker container
+//
+// The reference scan is not split into its own process: deltaBS.pl has no input
+// for a precomputed reference HMM scan, so every strain task still extracts and
+// hmmscans the reference proteome itself. Each newly computed strain therefore
+// pays for two proteome scans (its own and the reference's), roughly double the
+// work it would need with a shared reference scan.
+//
+// Finished strains are kept in storeDir, so re-runs and newly added strains only
+// compute the strains that are missing. The store path includes MD5 prefixes of
+// the reference and strain EMBL files, so an edited file is computed afresh
+// rather than served from the store; stale entries are never removed and can be
+// deleted by hand. CPUs and memory come from the 'deltabs' label.
 process runDeltaBS {
+    label 'deltabs'
+    tag "${strain_id}"
     container 'delta-bit-score'
     containerOptions = '-v /data/fast/salmonella/isangi/pseudogenes/2024.11.01:/mnt/deltaBS'
+    storeDir "${params.dbs_store_dir}/${reference_embl.baseName}.${reference_md5}/${embl_md5}"
     
     input:
-    tuple val(strain_id), path(embl_file)
-    path(reference_embl)
+    tuple val(strain_id), path(embl_file), val(embl_md5)
+    tuple path(reference_embl), val(reference_md5)
     
     output:
     tuple val(strain_id), path("${strain_id}/results.dbs")
@@ -25,7 +40,7 @@ process runDeltaBS {
         -hp /usr/bin/ \
         -hd /mnt/deltaBS \
         -t /tmp \
-        -C 32
+        -C ${task.cpus}
    """
 }
 
@@ -37,7 +52,7 @@ workflow {
         .fromPath("${params.input_dir}/*.embl")
         .map { file -> 
             def strain_id = file.name.toString().tokenize('.')[0]
-            return tuple(strain_id, file)
+            return tuple(strain_id, file, file.text.md5().take(12))
         }
 
     faa_files = Channel
@@ -48,9 +63,11 @@ workflow {
         }
 
     // Run deltaBS
+    // The reference is a value channel, so it is reused (and hashed once) for every strain
+    reference_embl = file(params.reference_embl)
     deltaBS_results = runDeltaBS(
         embl_files,
-        params.reference_embl
+        Channel.value(tuple(reference_embl, reference_embl.text.md5().take(12)))
     )
 
 }
@@ -0,0 +1,145 @@
+import pandas as pd
+import numpy as np
+import argparse
+
+from consensus_utils import deduplicate_by_consensus
+from coords_utils import STRAIN_MAPPING, evaluate_strain, summarize_call_level
+from dbs_utils import pooled_dbs_threshold, read_dbs
+from diamond_join_utils import build_diamond_table, process_diamond
+from gff_utils import read_gff
+from nuccio_utils import load_nuccio
+from output_utils import OUTPUT_FORMATS, write_sheets
+
+def process_anaerobic(file_path):
+    """Process anaerobic genes file"""
+    return pd.read_excel(file_path)['Reference locus tag(s)'].tolist()
+
+def read_optional(file_path, reader):
+    """Read an optional input file, returning None when no path is given"""
+    return reader(file_path) if file_path else None
+
+def calculate_concordance(coords_df, diamond_dedup_df, strain):
+    """
+    Compare the coordinate and DIAMOND calls for every truth gene.
+
+    The coordinate results are collapsed to one row per Index with the same
+    consensus rule as the DIAMOND table, then each method shared by both tables
+    gets a {method}_concordance column: 'both', 'coords_only', 'diamond_only' or
+    'neither'. The discordant column flags genes where any method disagrees.
+
+    Returns:
+        DataFrame with one row per Index
+    """
+    coords_dedup = deduplicate_by_consensus(coords_df, key='Index')
+    methods = [col for col in coords_dedup.columns
+               if col.endswith('_pseudogene') and col in diamond_dedup_df.columns]
+
+    concordance = coords_dedup[['Index', 'Reference locus tag(s)', strain]].rename(columns={strain: 'truth'})
+    diamond_calls = (diamond_dedup_df.set_index('Index')[methods]
+                     .reindex(concordance['Index']).fillna(0).to_numpy(dtype=bool))
+    coords_calls = coords_dedup[methods].to_numpy(dtype=bool)
+
+    labels = np.select([coords_calls & diamond_calls, coords_calls, diamond_calls],
+                       ['both', 'coords_only', 'diamond_only'], default='neither')
+    for i, method in enumerate(methods):
+        concordance[method.replace('_pseudogene', '_concordance')] = labels[:, i]
+    concordance['discordant'] = (coords_calls != diamond_calls).any(axis=1)
+    return concordance
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Validate pseudogene calls against the Nuccio data by both '
+                                     'coordinate overlap and DIAMOND best hits, reading every input once')
+    parser.add_argument('--nuccio', required=True, help='Path to Nuccio Excel file')
+    parser.add_argument('--gcf', required=True, help='GCF accession for strain lookup')
+    parser.add_argument('--bakta', help='Path to Bakta GFF3 file')
+    parser.add_argument('--pseudofinder-baktadb', help='Path to Pseudofinder GFF file (BaktaDB)')
+    parser.add_argument('--pseudofinder-salmonella', help='Path to Pseudofinder GFF file (Salmonella)')
+    parser.add_argument('--pseudofinder-ncbi', help='Path to Pseudofinder GFF file (NCBI)')
+    parser.add_argument('--diamond', required=True, help='Path to Diamond TSV file')
+    parser.add_argument('--dbs', help='Path to DBS TSV file')
+    parser.add_argument('--anaerobic', required=True, help='Path to anaerobic genes Excel file')
+    parser.add_argument('--coords-output', required=True,
+                        help='Path for the coordinate-based output Excel file (as written by 2a)')
+    parser.add_argument('--diamond-output', required=True,
+                        help='Path for the DIAMOND-based output Excel file (as written by 2b.1)')
+    parser.add_argument('--concordance-output',
+                        help='Path for a separate Excel file of per-gene coordinate/DIAMOND concordance '
+                        '(default: a Concordance sheet in the --coords-output workbook)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='excel',
+                        help='Write Excel, Parquet (one file per sheet, next to each output) or both')
+    parser.add_argument('--nuccio-cache-dir', help='Directory for the parsed Nuccio cache (default: .nuccio_cache next to the workbook)')
+    parser.add_argument('--no-nuccio-cache', action='store_true', help='Always re-parse the Nuccio workbook')
+    parser.add_argument('--min-overlap', type=float, default=0.0,
+                        help='Minimum fraction of a truth gene a call must cover to match it by coordinates '
+                        '(default: 0, any 1 bp overlap)')
+    parser.add_argument('--reciprocal', action='store_true',
+                        help='Require --min-overlap of both the truth gene and the call')
+    parser.add_argument('--dbs-pool', nargs='+',
+                        help='Call DBS genes above one cutoff shared by all strains: the 97.5th percentile '
+                        'of every delta-bitscore in these results.dbs files (default: per sample)')
+    parser.add_argument('--dbs-sketch-cache-dir',
+                        help='Directory for the cached per-file --dbs-pool sketches '
+                        '(default: .dbs_sketch_cache next to each file)')
+    args = parser.parse_args()
+
+    if args.gcf not in STRAIN_MAPPING:
+        parser.error(f'Unknown GCF accession: {args.gcf}')
+    if not 0 <= args.min_overlap <= 1:
+        parser.error('--min-overlap must be between 0 and 1')
+    return args
+
+def main():
+    args = parse_arguments()
+    strain = STRAIN_MAPPING[args.gcf]
+
+    # Read every input once; both matching strategies work from the same tables
+    nuccio_df, strain_coords = load_nuccio(args.nuccio, cache_dir=args.nuccio_cache_dir,
+                                           use_cache=not args.no_nuccio_cache)
+    anaerobic_genes = process_anaerobic(args.anaerobic)
+    diamond_df = process_diamond(args.diamond)
+    calls = {
+        'bakta': read_optional(args.bakta, read_gff),
+        'pseudofinder_baktadb': read_optional(args.pseudofinder_baktadb, read_gff),
+        'pseudofinder_salmonella': read_optional(args.pseudofinder_salmonella, read_gff),
+        'pseudofinder_ncbi': read_optional(args.pseudofinder_ncbi, read_gff),
+        'dbs': read_optional(args.dbs, read_dbs)
+    }
+    dbs_threshold = None
+    if args.dbs_pool:
+        dbs_threshold, _ = pooled_dbs_threshold(args.dbs_pool, cache_dir=args.dbs_sketch_cache_dir)
+
+    # Coordinate-based validation
+    truth_df = nuccio_df.drop(columns='UniProtKB_ID')
+    truth_df['central_anaerobic_metabolism'] = truth_df['Reference locus tag(s)'].isin(anaerobic_genes).astype(int)
+    coords_df, call_level, _ = evaluate_strain(truth_df, strain_coords, args.gcf,
+                                               min_overlap=args.min_overlap,
+                                               reciprocal=args.reciprocal, dbs_threshold=dbs_threshold,
+                                               **calls)
+    # DIAMOND-based validation
+    diamond_complete_df, diamond_dedup_df, dbs_threshold = build_diamond_table(
+        nuccio_df, diamond_df, anaerobic_genes, dbs_threshold=dbs_threshold, **calls)
+
+    # Per-gene agreement between the two matching strategies
+    concordance = calculate_concordance(coords_df, diamond_dedup_df, strain)
+
+    coords_sheets = {'Complete_Data': coords_df, 'Call_Level': call_level}
+    if not args.concordance_output:
+        coords_sheets['Concordance'] = concordance
+    written = write_sheets(coords_sheets, args.coords_output, args.output_format)
+    written += write_sheets({'Complete_Data': diamond_complete_df, 'Deduplicated_Data': diamond_dedup_df},
+                            args.diamond_output, args.output_format)
+    if args.concordance_output:
+        written += write_sheets({'Concordance': concordance}, args.concordance_output, args.output_format)
+
+    print(f"Processing complete. Output saved to: {', '.join(written)}")
+    print(f"Processed strain: {strain}")
+    if dbs_threshold is not None:
+        source = "pooled" if args.dbs_pool else "per sample"
+        print(f"DBS threshold for DIAMOND matching (97.5th percentile, {source}): {dbs_threshold:.2f}")
+    print("Call-level coordinate results:")
+    print(summarize_call_level(call_level).to_string(index=False))
+    print(f"Genes where coordinate and DIAMOND matching disagree: {concordance['discordant'].sum()} "
+          f"of {len(concordance)}")
+
+if __name__ == "__main__":
+    main()
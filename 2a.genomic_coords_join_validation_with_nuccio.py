@@ -1,309 +1,301 @@
 import pandas as pd
-import re
 import argparse
-import pprint
-
-# Mapping dictionary for strain lookups
-STRAIN_MAPPING = {
-    'GCF_000020705.1': 'SL476',
-    'GCF_000020745.1': 'CVM19633',
-    'GCF_000020885.1': 'SL483',
-    'GCF_000009505.1': 'P125109',
-    'GCF_000018705.1': 'SPB7',
-    'GCF_000195995.1': 'CT18',
-    'GCF_000007545.1': 'Ty2',
-    'GCF_000011885.1': 'ATCC 9150',
-    'GCF_000020925.1': 'CT_02021853',
-    'GCF_000009525.1': '287/91',
-    'GCF_000008105.1': 'SC-B67',
-    'GCF_000018385.1': 'RKS4594',
-    'GCF_000026565.1': 'AKU_12601'
-}
-
-SEQNAME_MAPPING = {
-    'GCF_000007545.1': {'contig_1': 'NC_004631.1'},
-    'GCF_000008105.1': {'contig_1': 'NC_006905.1', 'contig_2': 'NC_006855.1', 'contig_3': 'NC_006856.1'},
-    'GCF_000009505.1': {'contig_1': 'NC_011294.1'},
-    'GCF_000009525.1': {'contig_1': 'NC_011274.1'},
-    'GCF_000011885.1': {'contig_1': 'NC_006511.1'},
-    'GCF_000018385.1': {'contig_1': 'NC_012125.1', 'contig_2': 'NC_012124.1'},
-    'GCF_000018705.1': {'contig_1': 'NC_010102.1'},
-    'GCF_000020705.1': {'contig_1': 'NC_011083.1', 'contig_2': 'NC_011082.1', 'contig_3': 'NC_011081.1'},
-    'GCF_000020745.1': {'contig_1': 'NC_011094.1', 'contig_2': 'NC_011092.1', 'contig_3': 'NC_011093.1'},
-    'GCF_000020885.1': {'contig_1': 'NC_011149.1', 'contig_2': 'NC_011148.1'},
-    'GCF_000020925.1': {'contig_1': 'NC_011205.1', 'contig_2': 'NC_011204.1'},
-    'GCF_000026565.1': {'contig_1': 'NC_011147.1'},
-    'GCF_000195995.1': {'contig_1': 'NC_003198.1', 'contig_2': 'NC_003384.1', 'contig_3': 'NC_003385.1'}
-}
-
-def convert_seqname(seqname, gcf):
-    """Convert contig names to NC accessions based on GCF"""
-    if gcf in SEQNAME_MAPPING:
-        return SEQNAME_MAPPING[gcf].get(seqname, seqname)
-    return seqname
-
-def sanitize_coordinate(value: str) -> float:
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from cache_utils import source_files, stage_is_current, stage_manifest_path, write_stage_manifest
+from coords_utils import STRAIN_MAPPING, evaluate_strain, summarize_call_level
+from dbs_utils import pooled_dbs_threshold
+from nuccio_utils import load_nuccio
+from output_utils import OUTPUT_FORMATS, read_sheets, write_sheets
+from profiling_utils import StageProfiler
+
+# Code the outputs depend on; editing any of it invalidates the stage manifests
+STAGE_SOURCES = source_files(__file__, ['coords_utils', 'dbs_utils', 'gff_utils', 'nuccio_utils',
+                                         'output_utils', 'overlap_utils'])
+
+def process_nuccio(file_path, cache_dir=None, use_cache=True):
     """
-    Clean coordinate values by removing non-numeric characters (except minus sign and decimal point)
-    and converting to a float.
+    Read and process the nuccio file to get truth data.
+
+    Returns:
+        tuple: (truth DataFrame, long-form strain coordinates from nuccio_utils)
     """
-    if pd.isna(value):
-        return None
-    # Allow only digits, minus sign, and decimal point
-    cleaned = re.sub(r'[^\d.-]', '', str(value))
-    try:
-        return float(cleaned)
-    except ValueError:
-        return None
+    truth_df, strain_coords = load_nuccio(file_path, cache_dir=cache_dir, use_cache=use_cache)
+    return truth_df.drop(columns='UniProtKB_ID'), strain_coords
 
-def sanitize_seqname(value: str) -> str:
+def process_anaerobic(file_path):
+    """Process anaerobic genes file"""
+    return pd.read_excel(file_path)['Reference locus tag(s)'].tolist()
+
+def to_long_form(results_df, gcf):
+    """Reshape a strain's results to one row per truth gene and call set"""
+    strain = STRAIN_MAPPING[gcf]
+    pseudo_columns = [col for col in results_df.columns if col.endswith('_pseudogene')]
+    id_columns = ['Index', 'Reference locus tag(s)', 'central_anaerobic_metabolism']
+
+    long_df = (results_df[id_columns + [strain] + pseudo_columns]
+               .rename(columns={strain: 'truth'})
+               .melt(id_vars=id_columns + ['truth'], value_vars=pseudo_columns,
+                     var_name='method', value_name='called'))
+    long_df['method'] = long_df['method'].str.replace('_pseudogene', '', regex=False)
+    long_df.insert(0, 'gcf_acc', gcf)
+    long_df.insert(1, 'strain', strain)
+    return long_df
+
+SAMPLE_SHEET_COLUMNS = ['gcf', 'bakta', 'pseudofinder_baktadb', 'pseudofinder_salmonella',
+                        'pseudofinder_ncbi', 'dbs']
+
+def read_sample_sheet(file_path):
     """
-    Clean seqname by removing unwanted characters and standardizing format
+    Read a tab-separated sample sheet with a gcf column and optional bakta,
+    pseudofinder_baktadb, pseudofinder_salmonella, pseudofinder_ncbi and dbs path columns.
+
+    Returns:
+        list: One dict of evaluate_strain keyword arguments per sample
     """
-    if pd.isna(value):
-        return ''
-    # Remove '>' and any leading/trailing whitespace
-    cleaned = str(value).strip().lstrip('>')
-    return cleaned
-
-class GenomicRegion:
-    def __init__(self, seqname, start, end, gcf=None):
-        self.seqname = convert_seqname(sanitize_seqname(seqname), gcf) if gcf else sanitize_seqname(seqname)
-        start_coord = sanitize_coordinate(start)
-        end_coord = sanitize_coordinate(end)
-        
-        if start_coord is None or end_coord is None:
-            raise ValueError(f"Invalid coordinates: start={start}, end={end}")
-            
-        # Ensure start is less than end
-        self.start = int(min(start_coord, end_coord))
-        self.end = int(max(start_coord, end_coord))
-
-def check_overlap(region1, region2):
-    """Check if two genomic regions overlap"""
-    if region1.seqname != region2.seqname:
-        return False
-    return (region1.start <= region2.end) and (region2.start <= region1.end)
-
-def parse_strain_column(strain_data):
-    """Parse the strain column to extract genomic coordinates"""
+    sheet = pd.read_csv(file_path, sep='\t', dtype=str, comment='#')
+    if 'gcf' not in sheet.columns:
+        raise ValueError(f"Sample sheet {file_path} has no 'gcf' column")
+
+    unknown = set(sheet['gcf']) - set(STRAIN_MAPPING)
+    if unknown:
+        raise ValueError(f"Unknown GCF accession(s) in sample sheet: {', '.join(sorted(unknown))}")
+
+    sheet = sheet.astype(object).where(sheet.notna(), None)
+    return [{col: row[col] for col in SAMPLE_SHEET_COLUMNS if col in sheet.columns}
+            for _, row in sheet.iterrows()]
+
+# Shared inputs for batch workers, set once per worker process by _init_worker
+_WORKER_INPUTS = {}
+
+def _init_worker(truth_df, strain_coords, output_dir, output_format, dbs_sweep, min_overlap,
+                 reciprocal, dbs_threshold, shared_inputs, force, profile):
+    _WORKER_INPUTS.update(truth_df=truth_df, strain_coords=strain_coords, output_dir=output_dir,
+                          output_format=output_format, dbs_sweep=dbs_sweep,
+                          min_overlap=min_overlap, reciprocal=reciprocal, dbs_threshold=dbs_threshold,
+                          shared_inputs=shared_inputs, force=force, profile=profile)
+
+def _read_cached_sample(output, sample, output_format, dbs_sweep):
+    """Read back a sample's earlier outputs, or return None if they can't be read"""
+    sheet_names = ['Complete_Data', 'Call_Level']
+    if dbs_sweep and sample.get('bakta') and sample.get('dbs'):
+        sheet_names.append('DBS_Sweep')
     try:
-        parts = strain_data.split('|')
-        return GenomicRegion(parts[2], parts[3], parts[4])
-    except (IndexError, ValueError):
+        return read_sheets(output, sheet_names, output_format)
+    except (OSError, ValueError):
         return None
 
-def process_nuccio(file_path):
-    """Read and process the nuccio file to get truth data"""
-    df = pd.read_excel(file_path)
-    return df
-
-def extract_gene_id(attribute_string):
-    """Extract gene ID from GFF attribute string"""
-    match = re.search(r'ID=([^;]+)', attribute_string)
-    if match:
-        return match.group(1)
-    return None
-
-def extract_gene_id(attribute_string):
-    """Extract gene ID from GFF attribute string"""
-    match = re.search(r'ID=([^;]+)', attribute_string)
-    if match:
-        return match.group(1)
-    return None
-
-def process_bakta_gff(file_path, gcf=None):
-    """
-    Process a Bakta GFF file and return:
-    1. List of pseudogene regions 
-    2. Dictionary mapping gene IDs to GenomicRegion objects for all CDS/gene features
-    
-    Args:
-        file_path: Path to Bakta GFF file
-        gcf: GCF accession for coordinate conversion
-        
-    Returns:
-        tuple: (list of pseudogene GenomicRegions, dict of gene_id:GenomicRegion)
+def _run_sample(sample):
     """
-    if not file_path:
-        return [], {}
-        
-    df = pd.read_csv(file_path, sep='\t', comment='#', header=None,
-                     names=['seqname', 'source', 'feature', 'start', 'end', 
-                           'score', 'strand', 'frame', 'attribute'],
-                     low_memory=False)
-    
-    # Create coordinate mapping dictionary for all CDS/gene features
-    coord_dict = {}
-    pseudo_regions = []
-    
-    for _, row in df.iterrows():
-        # Process all CDS/gene features for coordinate dictionary
-        if row['feature'] == 'CDS' or row['feature'] == 'gene':
-            gene_id = extract_gene_id(row['attribute'])
-            if gene_id:
-                try:
-                    coord_dict[gene_id] = GenomicRegion(row['seqname'], row['start'], row['end'], gcf)
-                except ValueError:
-                    print(f"Warning: Invalid coordinates for gene {gene_id}")
-                    continue
-        
-        # Track pseudogene regions
-        if 'pseudo=True' in str(row['attribute']):
-            try:
-                pseudo_regions.append(GenomicRegion(row['seqname'], row['start'], row['end'], gcf))
-            except ValueError as e:
-                print(f"Warning: Skipping invalid pseudogene region: {e}")
-                continue
-    
-    return pseudo_regions, coord_dict
+    Evaluate and write one sample in a batch worker; returns its long-form results and DBS curve.
 
-def process_pseudofinder_gff(file_path, gcf=None):
+    Samples whose inputs and settings match their stage manifest are read back
+    from their earlier outputs instead of being evaluated again.
     """
-    Process a Pseudofinder GFF file and return list of pseudogene regions.
-    Only returns genomic regions marked as pseudogenes, no gene ID mapping needed.
-    
-    Args:
-        file_path: Path to Pseudofinder GFF file
-        gcf: GCF accession for coordinate conversion
-        
-    Returns:
-        list: List of GenomicRegion objects for pseudogenes
-    """
-    if not file_path:
-        return []
-        
-    df = pd.read_csv(file_path, sep='\t', comment='#', header=None,
-                     names=['seqname', 'source', 'feature', 'start', 'end', 
-                           'score', 'strand', 'frame', 'attribute'],
-                     low_memory=False)
-    
-    pseudo_regions = []
-    
-    for _, row in df.iterrows():
-        try:
-            pseudo_regions.append(GenomicRegion(row['seqname'], row['start'], row['end'], gcf))
-        except ValueError as e:
-            print(f"Warning: Skipping invalid Pseudofinder region: {e}")
-            continue
-    
-    return pseudo_regions
+    output_format = _WORKER_INPUTS['output_format']
+    dbs_sweep = _WORKER_INPUTS['dbs_sweep']
+    output = os.path.join(_WORKER_INPUTS['output_dir'], f"{sample['gcf']}.calls_vs_nuccio.coords.xlsx")
+    manifest = stage_manifest_path(output)
+    profiler = StageProfiler(_WORKER_INPUTS['profile'], script='2a', gcf=sample['gcf'])
+    inputs = _WORKER_INPUTS['shared_inputs'] + [sample.get(col) for col in SAMPLE_SHEET_COLUMNS[1:]]
+    params = {'sample': sample, 'output_format': output_format, 'dbs_sweep': dbs_sweep,
+              'min_overlap': _WORKER_INPUTS['min_overlap'], 'reciprocal': _WORKER_INPUTS['reciprocal'],
+              'dbs_threshold': _WORKER_INPUTS['dbs_threshold']}
 
-def process_dbs(file_path, coord_dict):
-    """Process DBS results file and extract coordinates using gene ID lookup"""
-    if not file_path or not coord_dict:
-        return []
-    
-    regions = []
-    df = pd.read_csv(file_path, sep='\t', skiprows=1)
-    
-    # Calculate 97.5th percentile threshold of delta-bitscore
-    threshold = df['delta-bitscore'].quantile(0.975)
-    
-    for _, row in df.iterrows():
-        if pd.notna(row['gene_2']) and row['delta-bitscore'] > threshold:
-            gene_id = row['gene_2'].split('|')[0] if '|' in row['gene_2'] else row['gene_2']
-            
-            if gene_id in coord_dict:
-                try:
-                    regions.append(coord_dict[gene_id])
-                except (ValueError, AttributeError) as e:
-                    print(f"Warning: Skipping invalid DBS region for gene {gene_id}: {e}")
-                    continue
-            else:
-                print(f"Warning: Gene ID {gene_id} not found in coordinate dictionary")
-    
-    return regions
+    sheets = None
+    if not _WORKER_INPUTS['force'] and stage_is_current(manifest, inputs, params, STAGE_SOURCES):
+        sheets = _read_cached_sample(output, sample, output_format, dbs_sweep)
+        if sheets is not None:
+            print(f"Skipped strain: {STRAIN_MAPPING[sample['gcf']]} (outputs up to date)")
 
-def calculate_overlaps(truth_df, strain_column, call_sets):
-    """Calculate overlaps between truth data and call sets"""
-    # Initialize pseudogene columns with zeros
-    for call_set_name in call_sets.keys():
-        truth_df[f'{call_set_name}_pseudogene'] = 0
-    
-    for idx, row in truth_df.iterrows():
-        strain_data = row[strain_column]
-        if pd.notna(strain_data) and strain_data != '3|Absent':
-            truth_coords = parse_strain_column(strain_data)
-            if truth_coords:
-                # Check each call set
-                for call_set_name, calls in call_sets.items():
-                    for call in calls:
-                        if check_overlap(call, truth_coords):
-                            truth_df.at[idx, f'{call_set_name}_pseudogene'] = 1
-                            break
-    
-    return truth_df
+    if sheets is None:
+        results_df, call_level, dbs_curve = evaluate_strain(_WORKER_INPUTS['truth_df'],
+                                                            _WORKER_INPUTS['strain_coords'],
+                                                            dbs_sweep=dbs_sweep,
+                                                            min_overlap=_WORKER_INPUTS['min_overlap'],
+                                                            reciprocal=_WORKER_INPUTS['reciprocal'],
+                                                            dbs_threshold=_WORKER_INPUTS['dbs_threshold'],
+                                                            profiler=profiler, **sample)
+        sheets = {'Complete_Data': results_df, 'Call_Level': call_level}
+        if dbs_curve is not None:
+            sheets['DBS_Sweep'] = dbs_curve
+        with profiler.stage('write_output', rows=len(results_df)):
+            written = write_sheets(sheets, output, output_format)
+        write_stage_manifest(manifest, inputs, params, written, STAGE_SOURCES)
+        print(f"Processed strain: {STRAIN_MAPPING[sample['gcf']]} -> {', '.join(written)}")
 
-def create_consensus_row(group):
-    """Create a consensus row from a group of rows based on pseudogene columns"""
-    consensus = group.iloc[0].copy()
-    
-    pseudo_columns = [col for col in group.columns if col.endswith('_pseudogene')]
-    
-    for col in pseudo_columns:
-        if col in group.columns:
-            consensus[col] = 1 if (group[col] == 1).any() else 0
-    
-    return pd.Series(consensus)
+    results_df = sheets['Complete_Data']
+    dbs_curve = sheets.get('DBS_Sweep')
+    if dbs_curve is not None:
+        dbs_curve.insert(0, 'gcf_acc', sample['gcf'])
+        dbs_curve.insert(1, 'strain', STRAIN_MAPPING[sample['gcf']])
+    return to_long_form(results_df, sample['gcf']), dbs_curve
 
-def process_anaerobic(file_path):
-    """Process anaerobic genes file"""
-    return pd.read_excel(file_path)['Reference locus tag(s)'].tolist()
+def run_batch(samples, truth_df, strain_coords, output_dir, workers=None, output_format='excel',
+              dbs_sweep=False, min_overlap=0.0, reciprocal=False, dbs_threshold=None, shared_inputs=(),
+              force=False, profile=None):
+    """
+    Evaluate all samples in a process pool, writing one output per strain.
+
+    The truth data is loaded once and handed to each worker process when it starts.
+    Strains whose outputs are still valid for their inputs are skipped unless force
+    is set; shared_inputs are the input files every strain depends on (Nuccio and
+    anaerobic workbooks). With dbs_sweep, each strain's curve is also written as a
+    DBS_Sweep sheet. A dbs_threshold (e.g. a pooled cutoff) is used for every
+    strain's DBS calls. With profile, each worker appends its per-strain stage
+    profiles to that JSON lines file.
+
+    Returns:
+        tuple: (combined long-form results for all strains,
+                combined DBS threshold curves or None)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(truth_df, strain_coords, output_dir, output_format,
+                                       dbs_sweep, min_overlap, reciprocal, dbs_threshold,
+                                       list(shared_inputs), force, profile)) as executor:
+        outputs = list(executor.map(_run_sample, samples))
+
+    long_tables = [long_df for long_df, _ in outputs]
+    curves = [curve for _, curve in outputs if curve is not None]
+    return (pd.concat(long_tables, ignore_index=True),
+            pd.concat(curves, ignore_index=True) if curves else None)
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process pseudogene data using coordinate overlap')
     parser.add_argument('--nuccio', required=True, help='Path to Nuccio Excel file')
-    parser.add_argument('--gcf', required=True, help='GCF accession for strain lookup')
+    parser.add_argument('--gcf', help='GCF accession for strain lookup')
     parser.add_argument('--bakta', help='Path to Bakta GFF3 file')
     parser.add_argument('--pseudofinder-baktadb', help='Path to Pseudofinder GFF file (BaktaDB)')
     parser.add_argument('--pseudofinder-salmonella', help='Path to Pseudofinder GFF file (Salmonella)')
     parser.add_argument('--pseudofinder-ncbi', help='Path to Pseudofinder GFF file (NCBI)')
     parser.add_argument('--dbs', help='Path to DBS TSV file')
     parser.add_argument('--anaerobic', required=True, help='Path to anaerobic genes Excel file')
-    parser.add_argument('--output', required=True, help='Path for output Excel file')
-    return parser.parse_args()
+    parser.add_argument('--output', help='Path for output Excel file (Parquet files are named after it)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='excel',
+                        help='Write Excel, Parquet (one file per sheet, next to --output) or both')
+    parser.add_argument('--nuccio-cache-dir', help='Directory for the parsed Nuccio cache (default: .nuccio_cache next to the workbook)')
+    parser.add_argument('--no-nuccio-cache', action='store_true', help='Always re-parse the Nuccio workbook')
+    parser.add_argument('--sample-sheet', help='Batch mode: TSV with a gcf column and bakta, pseudofinder_baktadb, '
+                        'pseudofinder_salmonella, pseudofinder_ncbi and dbs path columns')
+    parser.add_argument('--output-dir', help='Batch mode: directory for per-strain output Excel files')
+    parser.add_argument('--combined-output', help='Batch mode: path for the combined long-form CSV '
+                        '(default: all_strains.calls_vs_nuccio.coords.long.csv in --output-dir)')
+    parser.add_argument('--workers', type=int, help='Batch mode: number of worker processes (default: CPU count)')
+    parser.add_argument('--dbs-sweep', help='Path for a CSV of sensitivity/PPV at every DBS delta-bitscore cutoff '
+                        '(one curve per strain in batch mode); needs --bakta and --dbs')
+    parser.add_argument('--min-overlap', type=float, default=0.0,
+                        help='Minimum fraction of a truth gene a call must cover to match it '
+                        '(default: 0, any 1 bp overlap; the Nextflow min_overlap param is 0.1)')
+    parser.add_argument('--reciprocal', action='store_true',
+                        help='Require --min-overlap of both the truth gene and the call')
+    parser.add_argument('--dbs-pool', nargs='+',
+                        help='Call DBS genes above one cutoff shared by all strains: the 97.5th percentile '
+                        'of every delta-bitscore in these results.dbs files (default: each file\'s own)')
+    parser.add_argument('--dbs-sketch-cache-dir',
+                        help='Directory for the cached per-file --dbs-pool sketches '
+                        '(default: .dbs_sketch_cache next to each file)')
+    parser.add_argument('--force', action='store_true',
+                        help='Re-run even when the outputs are up to date with their inputs (see *.manifest.json)')
+    parser.add_argument('--profile', help='Append wall time, CPU time, peak memory and row counts of each stage '
+                        'to this file as JSON lines ("-" for stderr)')
+    args = parser.parse_args()
+
+    if not 0 <= args.min_overlap <= 1:
+        parser.error('--min-overlap must be between 0 and 1')
+    if args.sample_sheet:
+        if not args.output_dir:
+            parser.error('--output-dir is required with --sample-sheet')
+    elif not (args.gcf and args.output):
+        parser.error('--gcf and --output are required unless --sample-sheet is given')
+    return args
 
 def main():
     args = parse_arguments()
+
+    # Single-strain runs whose outputs are up to date are skipped before any input is read
+    stage_inputs = [args.nuccio, args.anaerobic, args.bakta, args.pseudofinder_baktadb,
+                    args.pseudofinder_salmonella, args.pseudofinder_ncbi, args.dbs] + (args.dbs_pool or [])
+    stage_params = {key: value for key, value in vars(args).items()
+                    if key not in ('force', 'workers', 'nuccio_cache_dir', 'no_nuccio_cache', 'profile',
+                                   'dbs_sketch_cache_dir')}
+    manifest = None if args.sample_sheet else stage_manifest_path(args.output)
+    if manifest and not args.force and stage_is_current(manifest, stage_inputs, stage_params, STAGE_SOURCES):
+        print(f"Outputs for {args.output} are up to date; nothing to do (use --force to re-run)")
+        return
     
-    # Get strain name from GCF accession
-    if args.gcf not in STRAIN_MAPPING:
-        raise ValueError(f"Unknown GCF accession: {args.gcf}")
-    strain = STRAIN_MAPPING[args.gcf]
-    
+    profiler = StageProfiler(args.profile, script='2a', gcf=args.gcf)
+
     # Process truth data and anaerobic
-    truth_df = process_nuccio(args.nuccio)
-    anaerobic_genes = process_anaerobic(args.anaerobic)
+    with profiler.stage('load_inputs') as stage:
+        truth_df, strain_coords = process_nuccio(args.nuccio, cache_dir=args.nuccio_cache_dir,
+                                                 use_cache=not args.no_nuccio_cache)
+        anaerobic_genes = process_anaerobic(args.anaerobic)
+        stage['rows'] = len(truth_df)
 
     # Add anaerobic metabolism column
     truth_df['central_anaerobic_metabolism'] = truth_df['Reference locus tag(s)'].isin(anaerobic_genes).astype(int)
-    
 
-    # Process Bakta GFF file to get both pseudogenes and coordinate dictionary
-    bakta_regions, coord_dict = process_bakta_gff(args.bakta, gcf=args.gcf)
-
-    # Process all call sets and store their coordinates
-    call_sets = {
-        'bakta': bakta_regions,
-        'pseudofinder_baktadb': process_pseudofinder_gff(args.pseudofinder_baktadb, gcf=args.gcf),
-        'pseudofinder_salmonella': process_pseudofinder_gff(args.pseudofinder_salmonella, gcf=args.gcf),
-        'pseudofinder_ncbi': process_pseudofinder_gff(args.pseudofinder_ncbi, gcf=args.gcf),
-        'dbs': process_dbs(args.dbs, coord_dict)
-    }
-    
-    # Remove empty call sets
-    call_sets = {k: v for k, v in call_sets.items() if v}
-    
-    # Calculate overlaps and update truth dataframe
-    results_df = calculate_overlaps(truth_df, strain, call_sets)
+    # One DBS cutoff for all strains, from the pooled delta-bitscores of the --dbs-pool files
+    dbs_threshold = None
+    if args.dbs_pool:
+        with profiler.stage('dbs_pool') as stage:
+            dbs_threshold, n_scores = pooled_dbs_threshold(args.dbs_pool, cache_dir=args.dbs_sketch_cache_dir)
+            stage['rows'] = n_scores
+        print(f"Pooled DBS threshold (97.5th percentile of {n_scores} scores in {len(args.dbs_pool)} files): "
+              f"{dbs_threshold:.2f}")
+
+    if args.sample_sheet:
+        samples = read_sample_sheet(args.sample_sheet)
+        combined_df, dbs_curves = run_batch(samples, truth_df, strain_coords, args.output_dir,
+                                            args.workers, args.output_format, bool(args.dbs_sweep),
+                                            args.min_overlap, args.reciprocal, dbs_threshold,
+                                            shared_inputs=[args.nuccio, args.anaerobic] + (args.dbs_pool or []),
+                                            force=args.force,
+                                            profile=args.profile)
+
+        combined_output = args.combined_output or os.path.join(
+            args.output_dir, 'all_strains.calls_vs_nuccio.coords.long.csv')
+        combined_df.to_csv(combined_output, index=False)
+
+        print(f"Processing complete. {len(samples)} strains written to: {args.output_dir}")
+        print(f"Combined long-form results saved to: {combined_output}")
+        if dbs_curves is not None:
+            dbs_curves.to_csv(args.dbs_sweep, index=False)
+            print(f"DBS threshold curves saved to: {args.dbs_sweep}")
+        return
+
+    results_df, call_level, dbs_curve = evaluate_strain(truth_df, strain_coords, args.gcf,
+                                                        bakta=args.bakta,
+                                                        pseudofinder_baktadb=args.pseudofinder_baktadb,
+                                                        pseudofinder_salmonella=args.pseudofinder_salmonella,
+                                                        pseudofinder_ncbi=args.pseudofinder_ncbi,
+                                                        dbs=args.dbs,
+                                                        dbs_sweep=bool(args.dbs_sweep),
+                                                        min_overlap=args.min_overlap,
+                                                        reciprocal=args.reciprocal,
+                                                        dbs_threshold=dbs_threshold,
+                                                        profiler=profiler)
     
-    # Write output to Excel file
-    results_df.to_excel(args.output, index=False)
+    # Write output to Excel and/or Parquet
+    with profiler.stage('write_output', rows=len(results_df)):
+        written = write_sheets({'Complete_Data': results_df, 'Call_Level': call_level},
+                               args.output, args.output_format)
     
-    print(f"Processing complete. Output saved to: {args.output}")
-    print(f"Processed strain: {strain}")
-    print("Sheets created: Complete_Data and Deduplicated_Data")
+    print(f"Processing complete. Output saved to: {', '.join(written)}")
+    print(f"Processed strain: {STRAIN_MAPPING[args.gcf]}")
+    print("Sheets created: Complete_Data, Call_Level")
+    print("Call-level results:")
+    print(summarize_call_level(call_level).to_string(index=False))
+    if dbs_curve is not None:
+        dbs_curve.to_csv(args.dbs_sweep, index=False)
+        best = dbs_curve[dbs_curve['optimal']].iloc[0]
+        print(f"DBS threshold curve saved to: {args.dbs_sweep}")
+        print(f"Best DBS cutoff by F1: {best['threshold']:.2f} ({best['percentile']:.1f}th percentile, "
+              f"sensitivity {best['sensitivity']:.3f}, PPV {best['ppv']:.3f})")
+        written.append(args.dbs_sweep)
+    write_stage_manifest(manifest, stage_inputs, stage_params, written, STAGE_SOURCES)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
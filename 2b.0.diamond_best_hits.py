@@ -3,20 +3,57 @@ import argparse
 import subprocess
 import os
 import sys
+import hashlib
+import shutil
+import tempfile
+
+from cache_utils import (file_lock, file_sha256, source_files, stage_is_current, stage_manifest_path,
+                         write_stage_manifest)
+from profiling_utils import NULL_PROFILER, StageProfiler
+
+# Code the outputs depend on; editing any of it invalidates the stage manifests
+STAGE_SOURCES = source_files(__file__)
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Perform one-way DIAMOND search analysis.')
-    parser.add_argument('--query_fasta', required=True,
+    parser.add_argument('--query_fasta',
                       help='Path to query protein FASTA file')
     parser.add_argument('--subject_fasta', required=True,
                       help='Path to subject protein FASTA file')
-    parser.add_argument('--output', required=True,
+    parser.add_argument('--output',
                       help='Path for output TSV file of best hits')
+    parser.add_argument('--query_fastas', nargs='+',
+                      help='Batch mode: query FASTA files searched together in one DIAMOND run; '
+                           'the sample name is the file name without its extension')
+    parser.add_argument('--output_dir',
+                      help='Batch mode: directory for the per-sample best hit files')
+    parser.add_argument('--output_suffix', default='_vs_nuccio.diamond.tsv',
+                      help='Batch mode: suffix appended to the sample name for each output file')
     parser.add_argument('--threads', type=int, default=4,
                       help='Number of threads for DIAMOND to use')
     parser.add_argument('--tmp_dir', default='diamond_tmp',
-                      help='Directory for temporary files')
-    return parser.parse_args()
+                      help='Directory for temporary files; each run works in its own subdirectory')
+    parser.add_argument('--scratch_dir',
+                      help='Parent directory for per-run workspaces, e.g. fast local disk (default: --tmp_dir)')
+    parser.add_argument('--keep_tmp', action='store_true',
+                      help='Keep the per-run workspace instead of deleting it')
+    parser.add_argument('--chunksize', type=int, default=1_000_000,
+                      help='Number of DIAMOND hits read at a time when selecting best hits')
+    parser.add_argument('--db_cache_dir',
+                      help='Directory for cached DIAMOND databases (default: <tmp_dir>/db_cache)')
+    parser.add_argument('--force', action='store_true',
+                      help='Search again even when the best hit files are up to date (see *.manifest.json)')
+    parser.add_argument('--profile',
+                      help='Append wall time, CPU time, peak memory and row counts of each stage '
+                           'to this file as JSON lines ("-" for stderr)')
+    args = parser.parse_args()
+
+    if args.query_fastas:
+        if args.query_fasta or not args.output_dir:
+            parser.error('--query_fastas needs --output_dir and cannot be combined with --query_fasta')
+    elif not (args.query_fasta and args.output):
+        parser.error('--query_fasta and --output are required unless --query_fastas is given')
+    return args
 
 def check_diamond_installation():
     """Check if DIAMOND is installed and accessible."""
@@ -39,7 +76,39 @@ def create_diamond_db(fasta_file, output_db, threads):
     except subprocess.CalledProcessError as e:
         sys.exit(f"Error creating DIAMOND database: {e.stderr}")
 
-def run_diamond_search(query_fasta, db_path, output_file, threads):
+def get_diamond_version():
+    """Return the version string reported by DIAMOND."""
+    result = subprocess.run(['diamond', 'version'], capture_output=True, check=True, text=True)
+    return result.stdout.strip()
+
+def get_cached_diamond_db(fasta_file, cache_dir, threads):
+    """
+    Return the path of a DIAMOND database for fasta_file, building it only if needed.
+
+    Databases are cached under cache_dir keyed by the FASTA checksum and the DIAMOND
+    version, so the same subject FASTA is only formatted once per DIAMOND install.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+
+    key_source = f"{file_sha256(fasta_file)}:{get_diamond_version()}"
+    key = hashlib.sha256(key_source.encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(fasta_file))[0]
+    db_path = os.path.join(cache_dir, f"{stem}.{key}")
+
+    # Concurrent runs wait here while one of them builds the database
+    with file_lock(f"{db_path}.lock"):
+        if os.path.exists(f"{db_path}.dmnd"):
+            print(f"Reusing cached DIAMOND database {db_path}.dmnd")
+            return db_path
+
+        # Build under a temporary name so an interrupted makedb never looks like a cache hit
+        print("Creating DIAMOND database...")
+        tmp_path = f"{db_path}.{os.getpid()}.tmp"
+        create_diamond_db(fasta_file, tmp_path, threads)
+        os.replace(f"{tmp_path}.dmnd", f"{db_path}.dmnd")
+    return db_path
+
+def run_diamond_search(query_fasta, db_path, output_file, threads, tmp_dir=None):
     """Run DIAMOND search with sensitive mode and specified output format."""
     cmd = [
         'diamond', 'blastp',
@@ -53,71 +122,240 @@ def run_diamond_search(query_fasta, db_path, output_file, threads):
         'evalue', 'bitscore', 'gaps',
         '--threads', str(threads)
     ]
+    if tmp_dir:
+        cmd += ['--tmpdir', tmp_dir]
     
     try:
         subprocess.run(cmd, check=True, capture_output=True, text=True)
     except subprocess.CalledProcessError as e:
         sys.exit(f"Error running DIAMOND search: {e.stderr}")
 
-def process_diamond_results(results_file, output_file):
-    """Process DIAMOND results to find best hits."""
-    # Load the file into DataFrame with the correct column names
-    column_names = [
-        'qseqid', 'qlen', 'sseqid', 'slen', 'pident', 'length',
-        'mismatch', 'gapopen', 'qstart', 'qend', 'sstart', 'send',
-        'evalue', 'bitscore', 'gaps'
-    ]
-    
-    df = pd.read_csv(results_file, sep='\t', names=column_names)
+DIAMOND_COLUMNS = [
+    'qseqid', 'qlen', 'sseqid', 'slen', 'pident', 'length',
+    'mismatch', 'gapopen', 'qstart', 'qend', 'sstart', 'send',
+    'evalue', 'bitscore', 'gaps'
+]
+
+# Fixed dtypes so every chunk of a large file is parsed the same way
+DIAMOND_DTYPES = {
+    'qlen': 'int64', 'slen': 'int64', 'length': 'int64', 'mismatch': 'int64',
+    'gapopen': 'int64', 'qstart': 'int64', 'qend': 'int64', 'sstart': 'int64',
+    'send': 'int64', 'gaps': 'int64',
+    'pident': 'float64', 'evalue': 'float64', 'bitscore': 'float64'
+}
 
+def filter_hits(df):
+    """Add protein ID and coverage columns and keep hits passing the coverage and e-value filters."""
     # Extract protein ID from sseqid by splitting on '|' and taking the second element
-    df['protein_id'] = df['sseqid'].apply(lambda x: x.split('|')[1] if '|' in x else x)
+    df['protein_id'] = df['sseqid'].str.split('|').str[1].where(
+        df['sseqid'].str.contains('|', regex=False), df['sseqid'])
 
     # Calculate query coverage and subject coverage
     df['query_cov'] = (df['length'] - df['gaps']) / df['qlen'] * 100
     df['subject_cov'] = (df['length'] - df['gaps']) / df['slen'] * 100
 
     # Filter based on query coverage, and evalue
-    filtered_results = df[
+    return df[
         (df['query_cov'] > 70) &
         (df['evalue'] < 1e-10)
     ]
 
-    # Identify the best hits for each query
-    best_hits = filtered_results.loc[filtered_results.groupby('qseqid')['bitscore'].idxmax()]
+def best_hit_per_query(df):
+    """Keep the highest-bitscore hit per query; ties go to the hit that comes first."""
+    return df.loc[df.groupby('qseqid')['bitscore'].idxmax()]
+
+def process_diamond_results(results_file, output_file=None, chunksize=1_000_000):
+    """
+    Process DIAMOND results to find best hits, saving them to output_file if given.
+
+    The file is read in chunks and a running best hit per query is kept, so memory
+    is proportional to the number of queries rather than the number of hits.
+    """
+    best_hits = None
+    for chunk in pd.read_csv(results_file, sep='\t', names=DIAMOND_COLUMNS,
+                             dtype=DIAMOND_DTYPES, chunksize=chunksize):
+        chunk_best = best_hit_per_query(filter_hits(chunk))
+        if best_hits is None:
+            best_hits = chunk_best
+        else:
+            # Earlier best hits come first so ties still resolve to the first hit in the file
+            best_hits = best_hit_per_query(pd.concat([best_hits, chunk_best]))
 
     # Save results
-    best_hits.to_csv(output_file, sep='\t', index=False)
+    if output_file:
+        best_hits.to_csv(output_file, sep='\t', index=False)
     return best_hits
 
+# Separates the sample name from the sequence ID in batch-mode query IDs
+SAMPLE_TAG_SEP = '::'
+
+def get_sample_name(fasta_file):
+    """Return the sample name for a query FASTA: its file name without extension."""
+    return os.path.splitext(os.path.basename(fasta_file))[0]
+
+def write_tagged_queries(query_fastas, output_fasta):
+    """
+    Concatenate query FASTAs into one file, prefixing every sequence ID with its
+    sample name so hits can be split back out after a single DIAMOND search.
+
+    Returns:
+        list: Sample names in input order
+    """
+    samples = [get_sample_name(path) for path in query_fastas]
+    if len(set(samples)) != len(samples):
+        sys.exit("Error: query FASTA file names must give unique sample names")
+    for sample in samples:
+        if SAMPLE_TAG_SEP in sample or any(c.isspace() for c in sample):
+            sys.exit(f"Error: sample name '{sample}' may not contain whitespace or '{SAMPLE_TAG_SEP}'")
+
+    with open(output_fasta, 'w') as out:
+        ends_with_newline = True
+        for sample, path in zip(samples, query_fastas):
+            with open(path) as handle:
+                for line in handle:
+                    if not ends_with_newline:
+                        # The previous file had no trailing newline
+                        out.write('\n')
+                    if line.startswith('>'):
+                        line = f">{sample}{SAMPLE_TAG_SEP}{line[1:]}"
+                    out.write(line)
+                    ends_with_newline = line.endswith('\n')
+    return samples
+
+def split_best_hits(best_hits, samples, output_dir, output_suffix):
+    """
+    Write batch-mode best hits to one file per sample, with sample tags removed
+    so each file matches what a single-sample run writes.
+
+    Returns:
+        dict: Sample name to number of best hits
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tags = best_hits['qseqid'].str.split(SAMPLE_TAG_SEP, n=1)
+    sample_of_hit = tags.str[0]
+    best_hits = best_hits.assign(qseqid=tags.str[1])
+
+    hit_counts = {}
+    for sample in samples:
+        sample_hits = best_hits[sample_of_hit == sample]
+        sample_hits.to_csv(os.path.join(output_dir, f"{sample}{output_suffix}"), sep='\t', index=False)
+        hit_counts[sample] = len(sample_hits)
+    return hit_counts
+
+def search_params(query_fasta, diamond_version):
+    """Parameters recorded in a best hit file's stage manifest"""
+    return {'query_fasta': query_fasta, 'diamond_version': diamond_version}
+
+def stale_queries(args, diamond_version):
+    """
+    Return the query FASTAs whose best hit files are missing or out of date.
+
+    A best hit file is up to date when its manifest records the same query and
+    subject FASTA contents and DIAMOND version. With --force every query is stale.
+    """
+    if args.query_fastas:
+        queries = [(path, os.path.join(args.output_dir, f"{get_sample_name(path)}{args.output_suffix}"))
+                   for path in args.query_fastas]
+    else:
+        queries = [(args.query_fasta, args.output)]
+
+    return [query for query, output in queries
+            if args.force or not stage_is_current(stage_manifest_path(output),
+                                                  [query, args.subject_fasta],
+                                                  search_params(query, diamond_version),
+                                                  STAGE_SOURCES)]
+
+def record_searches(args, query_fastas, diamond_version):
+    """Write the stage manifest of each searched query's best hit file"""
+    for query in query_fastas:
+        if args.query_fastas:
+            output = os.path.join(args.output_dir, f"{get_sample_name(query)}{args.output_suffix}")
+        else:
+            output = args.output
+        write_stage_manifest(stage_manifest_path(output), [query, args.subject_fasta],
+                             search_params(query, diamond_version), [output], STAGE_SOURCES)
+
+def run_single_search(args, subject_db, workspace, profiler=NULL_PROFILER):
+    """Search one query FASTA and write its best hits to args.output."""
+    search_results = os.path.join(workspace, "search_results.tsv")
+
+    # Run DIAMOND search
+    print("Running DIAMOND search...")
+    with profiler.stage('diamond_search'):
+        run_diamond_search(args.query_fasta, subject_db, search_results, args.threads, workspace)
+    
+    # Process results
+    print("Processing best hits...")
+    with profiler.stage('best_hits') as stage:
+        best_hits = process_diamond_results(search_results, args.output, args.chunksize)
+        stage['rows'] = len(best_hits)
+    
+    print(f"Found {len(best_hits)} best hits")
+    print(f"Results saved to {args.output}")
+
+def run_batch_search(args, subject_db, workspace, query_fastas=None, profiler=NULL_PROFILER):
+    """Search all samples (or just query_fastas) in one DIAMOND run, then demultiplex the best hits."""
+    search_results = os.path.join(workspace, "search_results.tsv")
+    tagged_queries = os.path.join(workspace, "tagged_queries.faa")
+    samples = write_tagged_queries(query_fastas or args.query_fastas, tagged_queries)
+
+    print(f"Running DIAMOND search for {len(samples)} samples...")
+    with profiler.stage('diamond_search', samples=len(samples)):
+        run_diamond_search(tagged_queries, subject_db, search_results, args.threads, workspace)
+
+    print("Processing best hits...")
+    with profiler.stage('best_hits') as stage:
+        best_hits = process_diamond_results(search_results, chunksize=args.chunksize)
+        hit_counts = split_best_hits(best_hits, samples, args.output_dir, args.output_suffix)
+        stage['rows'] = len(best_hits)
+
+    for sample, count in hit_counts.items():
+        print(f"{sample}: {count} best hits")
+    print(f"Results saved to {args.output_dir}")
+
 def main():
     # Parse command line arguments
     args = parse_args()
+    profiler = StageProfiler(args.profile, script='2b.0', output=args.output or args.output_dir)
     
     # Check if DIAMOND is installed
     check_diamond_installation()
     
+    # Only search queries whose best hits are missing or were made from other inputs
+    diamond_version = get_diamond_version()
+    if args.query_fastas:
+        # Reject clashing sample names before skipping any of them
+        write_tagged_queries(args.query_fastas, os.devnull)
+    queries = stale_queries(args, diamond_version)
+    if not queries:
+        print("Best hits are up to date; nothing to do (use --force to search again)")
+        return
+    if args.query_fastas and len(queries) < len(args.query_fastas):
+        print(f"Skipping {len(args.query_fastas) - len(queries)} samples with up-to-date best hits")
+
     # Create temporary directory if it doesn't exist
     os.makedirs(args.tmp_dir, exist_ok=True)
     
-    # Define paths for temporary files
-    subject_db = os.path.join(args.tmp_dir, "subject_db")
-    search_results = os.path.join(args.tmp_dir, "search_results.tsv")
-    
-    # Create DIAMOND database
-    print("Creating DIAMOND database...")
-    create_diamond_db(args.subject_fasta, subject_db, args.threads)
-    
-    # Run DIAMOND search
-    print("Running DIAMOND search...")
-    run_diamond_search(args.query_fasta, subject_db, search_results, args.threads)
+    # Reuse or create the DIAMOND database
+    db_cache_dir = args.db_cache_dir or os.path.join(args.tmp_dir, "db_cache")
+    with profiler.stage('makedb'):
+        subject_db = get_cached_diamond_db(args.subject_fasta, db_cache_dir, args.threads)
     
-    # Process results
-    print("Processing best hits...")
-    best_hits = process_diamond_results(search_results, args.output)
-    
-    print(f"Found {len(best_hits)} best hits")
-    print(f"Results saved to {args.output}")
+    # Give this run its own workspace so parallel runs never share temporary files
+    scratch_dir = args.scratch_dir or args.tmp_dir
+    os.makedirs(scratch_dir, exist_ok=True)
+    workspace = tempfile.mkdtemp(prefix='diamond_run_', dir=scratch_dir)
+    try:
+        if args.query_fastas:
+            run_batch_search(args, subject_db, workspace, queries, profiler)
+        else:
+            run_single_search(args, subject_db, workspace, profiler)
+        record_searches(args, queries, diamond_version)
+    finally:
+        if args.keep_tmp:
+            print(f"Temporary files kept in {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,43 +2,63 @@ import pandas as pd
 import os
 import argparse
 from pathlib import Path
-
-def calculate_metrics(df, method_col, truth_col):
-    """Calculate PPV, sensitivity, and counts for a given method column"""
-    # Convert truth values starting with '2' to 1, others to 0
-    true_positives = ((df[truth_col].astype(str).str.startswith('2')) & (df[method_col] == 1)).sum()
-    false_positives = ((~df[truth_col].astype(str).str.startswith('2')) & (df[method_col] == 1)).sum()
-    false_negatives = ((df[truth_col].astype(str).str.startswith('2')) & (df[method_col] == 0)).sum()
-    
-    # Calculate total positives
-    total_positives = (df[method_col] == 1).sum()
-    
-    # Calculate PPV and sensitivity
-    ppv = true_positives / (true_positives + false_positives) if (true_positives + false_positives) > 0 else 0
-    sensitivity = true_positives / (true_positives + false_negatives) if (true_positives + false_negatives) > 0 else 0
-    
-    return ppv, sensitivity, total_positives, true_positives
-
-def count_central_metabolism_pseudogenes(df, method_col):
-    """Count pseudogenes that are also central metabolism genes"""
-    return ((df[method_col] == 1) & (df['central_anaerobic_metabolism'] == 1)).sum()
-
-def count_group_pseudogenes(df, method_col, group_id):
-    """Count pseudogenes in a specific functional group"""
-    return ((df[method_col] == 1) & (df['Cross-reference'].str.contains(group_id, na=False))).sum()
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from cache_utils import source_files, stage_is_current, stage_manifest_path, write_stage_manifest
+from output_utils import find_result_files, read_result_table
+from profiling_utils import StageProfiler
+
+# Code the outputs depend on; editing any of it invalidates the stage manifests
+STAGE_SOURCES = source_files(__file__, ['output_utils'])
+
+# The methods to analyze
+METHODS = [
+    'bakta_pseudogene',
+    'pseudofinder_baktadb_pseudogene',
+    'pseudofinder_salmonella_pseudogene',
+    'pseudofinder_ncbi_pseudogene',
+    'dbs_pseudogene'
+]
+
+# Define functional groups
+FUNCTIONAL_GROUPS = {
+    'fimbrae': 'GroupID:G01',
+    'T3SS-1_effector': 'GroupID:G02',
+    'T3SS-2_effector': 'GroupID:G03',
+    'motility_chemotaxis': 'GroupID:G05'
+}
+
+def safe_ratio(numerator, denominator):
+    """Return numerator / denominator, or 0 when the denominator is 0"""
+    return numerator / denominator if denominator > 0 else 0
+
+def calculate_metrics(df, methods, truth_mask):
+    """
+    Calculate PPV, sensitivity and counts for all method columns at once.
+
+    Args:
+        df: Result table with a 0/1 column per method
+        methods: Method columns to score
+        truth_mask: Boolean array, True for truth pseudogenes (strain value starting with '2')
+
+    Returns:
+        dict: Metric name to array with one value per method
+    """
+    called = (df[methods] == 1).to_numpy()
+    not_called = (df[methods] == 0).to_numpy()
+    truth = truth_mask[:, None]
+
+    return {
+        'true_positives': (called & truth).sum(axis=0),
+        'false_positives': (called & ~truth).sum(axis=0),
+        'false_negatives': (not_called & truth).sum(axis=0),
+        'total_positives': called.sum(axis=0)
+    }
 
 def analyze_file(excel_path, strain_mapping, coord_matching):
-    """Analyze a single Excel file and return its metrics"""
-    # Read the Excel file
-    # if coord_matching is True:
-    # elif coord_matching is False:
-    try:    
-        df = pd.read_excel(excel_path, sheet_name='Deduplicated_Data')
-    except ValueError as e:
-        if "Worksheet named 'Deduplicated_Data' not found" in str(e):
-            df = pd.read_excel(excel_path)
-
-
+    """Analyze a single result file (Excel workbook or Parquet sheet) and return its metrics"""
+    df = read_result_table(excel_path)
     
     # Get the GCF accession from the filename
     gcf_acc = excel_path.stem.split('.calls_vs')[0]
@@ -48,81 +68,78 @@ def analyze_file(excel_path, strain_mapping, coord_matching):
         print(f"Warning: No strain mapping found for {gcf_acc}")
         return None
     
-    # The methods to analyze
-    methods = [
-        'bakta_pseudogene',
-        'pseudofinder_baktadb_pseudogene',
-        'pseudofinder_salmonella_pseudogene',
-        'pseudofinder_ncbi_pseudogene',
-        'dbs_pseudogene'
-    ]
-    
-    # Define functional groups
-    functional_groups = {
-        'fimbrae': 'GroupID:G01',
-        'T3SS-1_effector': 'GroupID:G02',
-        'T3SS-2_effector': 'GroupID:G03',
-        'motility_chemotaxis': 'GroupID:G05'
-    }
-    
-    positives_in_truth = df[strain].astype(str).str.startswith('2').sum()
-    # df[df[strain].astype(str).str.startswith('2')].to_csv(f'{strain}_pseudo.csv', index=False)
-
-    # print(strain, positives_in_truth)
-    positives_in_cam_truth = df[(df[strain].astype(str).str.startswith('2')) & (df['central_anaerobic_metabolism'] == 1)].shape[0]
+    # Truth, CAM and functional group membership are computed once per file
+    truth_mask = df[strain].astype(str).str.startswith('2').to_numpy()
+    cam_mask = (df['central_anaerobic_metabolism'] == 1).to_numpy()
+    group_masks = {group_name: df['Cross-reference'].str.contains(group_id, na=False).to_numpy()
+                   for group_name, group_id in FUNCTIONAL_GROUPS.items()}
 
     results = {
         'strain': strain,
         'gcf_acc': gcf_acc,
-        'total_positives_in_truth': positives_in_truth,
-        'total_positives_in_cam_truth': positives_in_cam_truth
+        'total_positives_in_truth': truth_mask.sum(),
+        'total_positives_in_cam_truth': (truth_mask & cam_mask).sum()
     }
     
     # Count truth positives for each functional group
-    for group_name, group_id in functional_groups.items():
-        truth_count = df[(df[strain].astype(str).str.startswith('2')) & 
-                        (df['Cross-reference'].str.contains(group_id, na=False))].shape[0]
-        results[f'{group_name}_truth'] = truth_count
-
-    for method in methods:
-        ppv, sens, total_pos, true_pos = calculate_metrics(df, method, strain)
-        cam_count = count_central_metabolism_pseudogenes(df, method)
+    for group_name, group_mask in group_masks.items():
+        results[f'{group_name}_truth'] = (truth_mask & group_mask).sum()
+
+    # Score every method in one pass over a (genes x methods) matrix
+    metrics = calculate_metrics(df, METHODS, truth_mask)
+    called = (df[METHODS] == 1).to_numpy()
+    cam_counts = called[cam_mask].sum(axis=0)
+    group_counts = {group_name: called[group_mask].sum(axis=0)
+                    for group_name, group_mask in group_masks.items()}
+
+    for i, method in enumerate(METHODS):
+        true_pos = metrics['true_positives'][i]
+        false_pos = metrics['false_positives'][i]
+        false_neg = metrics['false_negatives'][i]
         
         # Add basic metrics
         results.update({
-            f'{method}_ppv': ppv,
-            f'{method}_sensitivity': sens,
-            f'{method}_total_positives': total_pos,
+            f'{method}_ppv': safe_ratio(true_pos, true_pos + false_pos),
+            f'{method}_sensitivity': safe_ratio(true_pos, true_pos + false_neg),
+            f'{method}_total_positives': metrics['total_positives'][i],
             f'{method}_true_positives': true_pos,
-            f'{method}_cam_count': cam_count
+            f'{method}_cam_count': cam_counts[i]
         })
         
         # Add functional group counts
-        for group_name, group_id in functional_groups.items():
-            group_count = count_group_pseudogenes(df, method, group_id)
-            results[f'{method}_{group_name}_count'] = group_count
+        for group_name in FUNCTIONAL_GROUPS:
+            results[f'{method}_{group_name}_count'] = group_counts[group_name][i]
     
     return results
 
-def analyze_all_files(todo_list, strain_mapping, coord_matching = False):
-    """Analyze all Excel files in the directory"""
-    results = []
-    
-    for file_path in todo_list:
-        if str(file_path).split('/')[-1].startswith('~'):
-            continue
-        file = Path(file_path)
-        result = analyze_file(file, strain_mapping, coord_matching)
-        if result:
-            results.append(result)
+def analyze_all_files(todo_list, strain_mapping, coord_matching = False, workers=None):
+    """
+    Analyze all result files, reading and scoring them in a pool of worker processes.
+
+    Set workers to 1 to analyze the files serially in this process.
+    """
+    files = [Path(file_path) for file_path in todo_list
+             if not str(file_path).split('/')[-1].startswith('~')]
+
+    if workers == 1:
+        results = [analyze_file(file, strain_mapping, coord_matching) for file in files]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(analyze_file, files,
+                                        repeat(strain_mapping), repeat(coord_matching)))
     
-    return pd.DataFrame(results)
+    return pd.DataFrame([result for result in results if result])
 
 def main():
-    parser = argparse.ArgumentParser(description='Analyze pseudogene statistics from Excel files')
-    parser.add_argument('--input_dir', help='Directory containing input Excel files')
-    parser.add_argument('--output_file', help='Output CSV filename')
+    parser = argparse.ArgumentParser(description='Analyze pseudogene statistics from Excel or Parquet result files')
+    parser.add_argument('--input_dir', help='Directory containing input Excel or Parquet result files')
+    parser.add_argument('--output_file', required=True, help='Output CSV filename')
     parser.add_argument('--coord-matching', action='store_true', help='Enable coordinate matching')
+    parser.add_argument('--workers', type=int, help='Number of worker processes (default: CPU count; 1 to run serially)')
+    parser.add_argument('--force', action='store_true',
+                        help='Re-run even when the output is up to date with the result files (see *.manifest.json)')
+    parser.add_argument('--profile', help='Append wall time, CPU time, peak memory and row counts of each stage '
+                        'to this file as JSON lines ("-" for stderr)')
     args = parser.parse_args()
 
     STRAIN_MAPPING = {
@@ -157,15 +174,26 @@ def main():
         'GCF_000026565.1': 'EI'
     }
 
-    # Get list of Excel files in input directory
+    # Get list of Excel and Parquet result files in input directory
     input_dir = Path(args.input_dir)
-    list_of_excels = list(input_dir.glob('*.xlsx'))
+    result_files = find_result_files(input_dir)
     
-    if not list_of_excels:
-        print(f"No Excel files found in {input_dir}")
+    if not result_files:
+        print(f"No Excel or Parquet result files found in {input_dir}")
+        return
+
+    # Skip the run when the output was made from the same result files and settings
+    stage_params = {'result_files': [str(path) for path in result_files],
+                    'coord_matching': args.coord_matching}
+    manifest = stage_manifest_path(args.output_file)
+    if not args.force and stage_is_current(manifest, result_files, stage_params, STAGE_SOURCES):
+        print(f"{args.output_file} is up to date; nothing to do (use --force to re-run)")
         return
 
-    results = analyze_all_files(list_of_excels, STRAIN_MAPPING, coord_matching=args.coord_matching)
+    profiler = StageProfiler(args.profile, script='3', output=args.output_file)
+    with profiler.stage('analyze_files', rows=len(result_files)):
+        results = analyze_all_files(result_files, STRAIN_MAPPING, coord_matching=args.coord_matching,
+                                    workers=args.workers)
     
     # Add salm_type column based on GCF accession lookup
     results['salm_type'] = results['gcf_acc'].map(ei_gi_lookup)
@@ -177,7 +205,9 @@ def main():
     results = results[cols]
 
     # Save results
-    results.to_csv(args.output_file, index=False)
+    with profiler.stage('write_output', rows=len(results)):
+        results.to_csv(args.output_file, index=False)
+    write_stage_manifest(manifest, result_files, stage_params, [args.output_file], STAGE_SOURCES)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -4,113 +4,139 @@ import seaborn as sns
 from scipy import stats
 import argparse
 
+from cache_utils import source_files, stage_is_current, stage_manifest_path, write_stage_manifest
+from profiling_utils import StageProfiler
+
+# Code the outputs depend on; editing any of it invalidates the stage manifests
+STAGE_SOURCES = source_files(__file__)
+
 def main():
     parser = argparse.ArgumentParser(description='Generate validation plots from CSV data')
     parser.add_argument('--input_file', help='Input CSV file path')
     parser.add_argument('--ppv_plot', default='ppv_sensitivity_plot.png', help='Output path for PPV vs Sensitivity plot')
     parser.add_argument('--truth_plot', default='truth_vs_total_positives.png', help='Output path for Truth vs Total Positives plot')
     parser.add_argument('--cam_plot', default='cam_truth_vs_cam_count.png', help='Output path for CAM Truth vs CAM Count plot')
+    parser.add_argument('--force', action='store_true',
+                        help='Re-draw the plots even when they are up to date with the input (see *.manifest.json)')
+    parser.add_argument('--profile', help='Append wall time, CPU time, peak memory and row counts of each stage '
+                        'to this file as JSON lines ("-" for stderr)')
     args = parser.parse_args()
 
+    # Skip drawing when the plots were made from the same input file
+    plots = [args.ppv_plot, args.truth_plot, args.cam_plot]
+    manifest = stage_manifest_path(args.ppv_plot)
+    if not args.force and stage_is_current(manifest, [args.input_file], {'plots': plots}, STAGE_SOURCES):
+        print("Plots are up to date; nothing to do (use --force to re-draw)")
+        return
+
+    profiler = StageProfiler(args.profile, script='4', input=args.input_file)
+
     # Read data
-    df = pd.read_csv(args.input_file)
+    with profiler.stage('load_input') as stage:
+        df = pd.read_csv(args.input_file)
+        stage['rows'] = len(df)
 
     # Define markers
     salm_markers = {'EI': 'o', 'GI': 's'}
 
     # Create and save PPV vs Sensitivity plot
-    plt.figure(figsize=(10, 6))
-    tool_colors = {
-        'bakta': '#1f77b4',
-        'pseudofinder_baktadb': '#ff7f0e',
-        'pseudofinder_salmonella': '#2ca02c',
-        'pseudofinder_ncbi': '#d62728',
-        'dbs': '#9467bd'
-    }
-
-    for tool in ['bakta', 'pseudofinder_baktadb', 'pseudofinder_salmonella', 'pseudofinder_ncbi', 'dbs']:
-        ppv_col = f'{tool}_pseudogene_ppv'
-        sens_col = f'{tool}_pseudogene_sensitivity'
-        
+    with profiler.stage('ppv_plot', rows=len(df)):
+        plt.figure(figsize=(10, 6))
+        tool_colors = {
+            'bakta': '#1f77b4',
+            'pseudofinder_baktadb': '#ff7f0e',
+            'pseudofinder_salmonella': '#2ca02c',
+            'pseudofinder_ncbi': '#d62728',
+            'dbs': '#9467bd'
+        }
+
+        for tool in ['bakta', 'pseudofinder_baktadb', 'pseudofinder_salmonella', 'pseudofinder_ncbi', 'dbs']:
+            ppv_col = f'{tool}_pseudogene_ppv'
+            sens_col = f'{tool}_pseudogene_sensitivity'
+
+            for salm_type in df['salm_type'].unique():
+                mask = df['salm_type'] == salm_type
+                plt.scatter(
+                    df[mask][sens_col], 
+                    df[mask][ppv_col],
+                    c=[tool_colors[tool]],
+                    marker=salm_markers[salm_type],
+                    label=f'{tool} ({salm_type})',
+                    s=100
+                )
+
+        plt.xlabel('Sensitivity')
+        plt.ylabel('PPV')
+        plt.title('PPV vs Sensitivity by Tool and Strain Type')
+        plt.xlim(0, 1)
+        plt.ylim(0, 1)
+        plt.grid(True, linestyle='--', alpha=0.7)
+        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+        plt.tight_layout()
+        plt.savefig(args.ppv_plot, bbox_inches='tight', dpi=300)
+        plt.close()
+
+    # Create and save Truth vs Total Positives correlation plot
+    with profiler.stage('truth_plot', rows=len(df)):
+        plt.figure(figsize=(10, 6))
+        x1 = df['total_positives_in_truth']
+        y1 = df['pseudofinder_baktadb_pseudogene_total_positives']
+        slope1, intercept1, r_value1, p_value1, std_err1 = stats.linregress(x1, y1)
+        r_squared1 = r_value1 ** 2
+
         for salm_type in df['salm_type'].unique():
             mask = df['salm_type'] == salm_type
             plt.scatter(
-                df[mask][sens_col], 
-                df[mask][ppv_col],
-                c=[tool_colors[tool]],
+                df[mask]['total_positives_in_truth'],
+                df[mask]['pseudofinder_baktadb_pseudogene_total_positives'],
                 marker=salm_markers[salm_type],
-                label=f'{tool} ({salm_type})',
+                label=f'{salm_type}',
                 s=100
             )
 
-    plt.xlabel('Sensitivity')
-    plt.ylabel('PPV')
-    plt.title('PPV vs Sensitivity by Tool and Strain Type')
-    plt.xlim(0, 1)
-    plt.ylim(0, 1)
-    plt.grid(True, linestyle='--', alpha=0.7)
-    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-    plt.tight_layout()
-    plt.savefig(args.ppv_plot, bbox_inches='tight', dpi=300)
-    plt.close()
-
-    # Create and save Truth vs Total Positives correlation plot
-    plt.figure(figsize=(10, 6))
-    x1 = df['total_positives_in_truth']
-    y1 = df['pseudofinder_baktadb_pseudogene_total_positives']
-    slope1, intercept1, r_value1, p_value1, std_err1 = stats.linregress(x1, y1)
-    r_squared1 = r_value1 ** 2
-
-    for salm_type in df['salm_type'].unique():
-        mask = df['salm_type'] == salm_type
-        plt.scatter(
-            df[mask]['total_positives_in_truth'],
-            df[mask]['pseudofinder_baktadb_pseudogene_total_positives'],
-            marker=salm_markers[salm_type],
-            label=f'{salm_type}',
-            s=100
-        )
-
-    plt.plot(x1, slope1 * x1 + intercept1, color='red', label=f'y = {slope1:.2f}x + {intercept1:.2f}')
-    plt.xlabel('Total Positives in Truth')
-    plt.ylabel('Pseudofinder Baktadb Total Positives')
-    plt.title(f'Correlation Analysis (r² = {r_squared1:.3f}, p = {p_value1:.3e})')
-    plt.grid(True, linestyle='--', alpha=0.7)
-    plt.legend()
-    plt.xlim(0, max(x1) * 1.1)
-    plt.ylim(0, max(y1) * 1.1)
-    plt.tight_layout()
-    plt.savefig(args.truth_plot, bbox_inches='tight', dpi=300)
-    plt.close()
+        plt.plot(x1, slope1 * x1 + intercept1, color='red', label=f'y = {slope1:.2f}x + {intercept1:.2f}')
+        plt.xlabel('Total Positives in Truth')
+        plt.ylabel('Pseudofinder Baktadb Total Positives')
+        plt.title(f'Correlation Analysis (r² = {r_squared1:.3f}, p = {p_value1:.3e})')
+        plt.grid(True, linestyle='--', alpha=0.7)
+        plt.legend()
+        plt.xlim(0, max(x1) * 1.1)
+        plt.ylim(0, max(y1) * 1.1)
+        plt.tight_layout()
+        plt.savefig(args.truth_plot, bbox_inches='tight', dpi=300)
+        plt.close()
 
     # Create and save CAM Truth vs CAM Count correlation plot
-    plt.figure(figsize=(10, 6))
-    x2 = df['total_positives_in_cam_truth']
-    y2 = df['pseudofinder_baktadb_pseudogene_cam_count']
-    slope2, intercept2, r_value2, p_value2, std_err2 = stats.linregress(x2, y2)
-    r_squared2 = r_value2 ** 2
-
-    for salm_type in df['salm_type'].unique():
-        mask = df['salm_type'] == salm_type
-        plt.scatter(
-            df[mask]['total_positives_in_cam_truth'],
-            df[mask]['pseudofinder_baktadb_pseudogene_cam_count'],
-            marker=salm_markers[salm_type],
-            label=f'{salm_type}',
-            s=100
-        )
-
-    plt.plot(x2, slope2 * x2 + intercept2, color='red', label=f'y = {slope2:.2f}x + {intercept2:.2f}')
-    plt.xlabel('Total Positives in CAM Truth')
-    plt.ylabel('Pseudofinder Baktadb CAM Count')
-    plt.title(f'Correlation Analysis (r² = {r_squared2:.3f}, p = {p_value2:.3e})')
-    plt.grid(True, linestyle='--', alpha=0.7)
-    plt.legend()
-    plt.xlim(0, max(x2) * 1.1)
-    plt.ylim(0, max(y2) * 1.1)
-    plt.tight_layout()
-    plt.savefig(args.cam_plot, bbox_inches='tight', dpi=300)
-    plt.close()
+    with profiler.stage('cam_plot', rows=len(df)):
+        plt.figure(figsize=(10, 6))
+        x2 = df['total_positives_in_cam_truth']
+        y2 = df['pseudofinder_baktadb_pseudogene_cam_count']
+        slope2, intercept2, r_value2, p_value2, std_err2 = stats.linregress(x2, y2)
+        r_squared2 = r_value2 ** 2
+
+        for salm_type in df['salm_type'].unique():
+            mask = df['salm_type'] == salm_type
+            plt.scatter(
+                df[mask]['total_positives_in_cam_truth'],
+                df[mask]['pseudofinder_baktadb_pseudogene_cam_count'],
+                marker=salm_markers[salm_type],
+                label=f'{salm_type}',
+                s=100
+            )
+
+        plt.plot(x2, slope2 * x2 + intercept2, color='red', label=f'y = {slope2:.2f}x + {intercept2:.2f}')
+        plt.xlabel('Total Positives in CAM Truth')
+        plt.ylabel('Pseudofinder Baktadb CAM Count')
+        plt.title(f'Correlation Analysis (r² = {r_squared2:.3f}, p = {p_value2:.3e})')
+        plt.grid(True, linestyle='--', alpha=0.7)
+        plt.legend()
+        plt.xlim(0, max(x2) * 1.1)
+        plt.ylim(0, max(y2) * 1.1)
+        plt.tight_layout()
+        plt.savefig(args.cam_plot, bbox_inches='tight', dpi=300)
+        plt.close()
+
+    write_stage_manifest(manifest, [args.input_file], {'plots': plots}, plots, STAGE_SOURCES)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,42 @@
+import argparse
+import sys
+
+from dbs_utils import annotate_dbs, read_dbs
+from gff_utils import read_gff
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Annotate deltaBS results with the GFF feature of each gene (gene_2 = locus_tag)')
+    parser.add_argument('--dbs', nargs='+', required=True,
+                        help='deltaBS results.dbs files (or Excel copies), one per strain')
+    parser.add_argument('--gff', nargs='+', required=True,
+                        help='GFF3 file for each --dbs file, in the same order; a single GFF is used for all')
+    parser.add_argument('--output',
+                        help='Output CSV when annotating one strain (default: <dbs file>.annot.csv)')
+    parser.add_argument('--key', choices=['locus_tag', 'ID'], default='locus_tag',
+                        help='GFF attribute the gene_2 IDs are matched to (default: locus_tag)')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    if len(args.gff) not in (1, len(args.dbs)):
+        sys.exit("Error: give one --gff file, or one per --dbs file")
+    if args.output and len(args.dbs) > 1:
+        sys.exit("Error: --output can only be used with a single --dbs file")
+    gffs = args.gff * len(args.dbs) if len(args.gff) == 1 else args.gff
+
+    # Each GFF is read once, however many strains share it
+    gff_tables = {}
+    for dbs_path, gff_path in zip(args.dbs, gffs):
+        if gff_path not in gff_tables:
+            gff_tables[gff_path] = read_gff(gff_path)
+
+        annotated = annotate_dbs(read_dbs(dbs_path), gff_tables[gff_path], key=args.key)
+        output = args.output or f"{dbs_path.rsplit('.xlsx', 1)[0]}.annot.csv"
+        annotated.to_csv(output, index=False, na_rep='NA')
+
+        matched = annotated['feature'].notna().sum()
+        print(f"{dbs_path}: annotated {matched} of {len(annotated)} rows; saved to {output}")
+
+if __name__ == "__main__":
+    main()
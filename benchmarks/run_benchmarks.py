@@ -0,0 +1,203 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from consensus_utils import deduplicate_by_consensus
+from coords_utils import calculate_overlaps, process_bakta_gff, process_dbs, process_pseudofinder_gff
+from diamond_join_utils import build_diamond_table, process_diamond
+from nuccio_utils import parse_nuccio
+from output_utils import write_sheets
+from synthetic_data import generate_dataset
+
+REPORT_VERSION = 1
+
+
+def load_script(file_name):
+    """
+    Import one of the numbered pipeline scripts as a module. It is registered in
+    sys.modules so its functions can be pickled for worker processes.
+    """
+    path = os.path.join(REPO_DIR, file_name)
+    spec = importlib.util.spec_from_file_location(os.path.splitext(file_name)[0].replace('.', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def time_stage(func, repeats):
+    """
+    Run func repeats times and return its last result with the timings.
+
+    The best run is the headline figure; it is the least affected by other load
+    on the machine.
+    """
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - start)
+    return result, {'seconds': min(runs), 'mean_seconds': sum(runs) / len(runs), 'runs': runs}
+
+
+def run_benchmarks(dataset, work_dir, repeats, workers):
+    """
+    Time each pipeline stage over every genome of a synthetic dataset.
+
+    Returns:
+        dict: Stage name to timings (see time_stage) and the number of rows processed
+    """
+    best_hits_script = load_script('2b.0.diamond_best_hits.py')
+    stats_script = load_script('3.pseudogene_stats.py')
+    genomes = dataset['genomes']
+    mapping = dataset['strain_mapping']
+    stages = {}
+
+    (truth_df, strain_coords), timing = time_stage(lambda: parse_nuccio(dataset['nuccio']), repeats)
+    stages['parse_nuccio'] = dict(timing, rows=len(truth_df))
+    truth_df['central_anaerobic_metabolism'] = 0
+
+    bakta, timing = time_stage(lambda: [process_bakta_gff(g['bakta']) for g in genomes], repeats)
+    stages['process_bakta_gff'] = dict(timing, rows=sum(len(coord_table) for _, coord_table in bakta))
+
+    call_sets = []
+    for genome, (bakta_regions, coord_table) in zip(genomes, bakta):
+        calls = {'bakta': bakta_regions}
+        for source in ('baktadb', 'salmonella', 'ncbi'):
+            calls[f'pseudofinder_{source}'] = process_pseudofinder_gff(genome[f'pseudofinder_{source}'])
+        calls['dbs'] = process_dbs(genome['dbs'], coord_table)
+        call_sets.append(calls)
+
+    coords_truth = truth_df.drop(columns='UniProtKB_ID')
+    results, timing = time_stage(
+        lambda: [calculate_overlaps(coords_truth.copy(), mapping[g['gcf']], calls, strain_coords)
+                 for g, calls in zip(genomes, call_sets)], repeats)
+    stages['calculate_overlaps'] = dict(timing, rows=sum(sum(len(v) for v in calls.values())
+                                                         for calls in call_sets))
+
+    best_hits_dir = os.path.join(work_dir, 'best_hits')
+    os.makedirs(best_hits_dir, exist_ok=True)
+    best_hit_paths = [os.path.join(best_hits_dir, f"{g['gcf']}_vs_nuccio.diamond.tsv") for g in genomes]
+    _, timing = time_stage(
+        lambda: [best_hits_script.process_diamond_results(g['raw_diamond'], path)
+                 for g, path in zip(genomes, best_hit_paths)], repeats)
+    raw_rows = 0
+    for genome in genomes:
+        with open(genome['raw_diamond']) as handle:
+            raw_rows += sum(1 for _ in handle)
+    stages['process_diamond_results'] = dict(timing, rows=raw_rows)
+
+    complete_tables = [
+        build_diamond_table(truth_df, process_diamond(path), [], bakta=g['bakta'],
+                            pseudofinder_baktadb=g['pseudofinder_baktadb'],
+                            pseudofinder_salmonella=g['pseudofinder_salmonella'],
+                            pseudofinder_ncbi=g['pseudofinder_ncbi'], dbs=g['dbs'])[0]
+        for g, path in zip(genomes, best_hit_paths)]
+    _, timing = time_stage(lambda: [deduplicate_by_consensus(df, key='Index') for df in complete_tables],
+                           repeats)
+    stages['deduplicate_by_consensus'] = dict(timing, rows=sum(len(df) for df in complete_tables))
+
+    results_dir = os.path.join(work_dir, 'results')
+    os.makedirs(results_dir, exist_ok=True)
+    result_files = []
+    for genome, results_df in zip(genomes, results):
+        output = os.path.join(results_dir, f"{genome['gcf']}.calls_vs_nuccio.coords.xlsx")
+        result_files += write_sheets({'Complete_Data': results_df}, output, 'parquet')
+    stats, timing = time_stage(
+        lambda: stats_script.analyze_all_files(result_files, mapping, workers=workers), repeats)
+    stages['analyze_all_files'] = dict(timing, rows=len(result_files))
+
+    return stages
+
+
+def compare_reports(report, baseline, tolerance):
+    """
+    Compare stage timings with a baseline report.
+
+    Returns:
+        list: (stage, baseline seconds, current seconds) for stages slower than
+        tolerance times their baseline
+    """
+    regressions = []
+    for stage, timing in report['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if previous and timing['seconds'] > previous['seconds'] * tolerance:
+            regressions.append((stage, previous['seconds'], timing['seconds']))
+    return regressions
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark the Python pipeline stages on synthetic inputs')
+    parser.add_argument('--genomes', type=int, default=13, help='Number of synthetic genomes')
+    parser.add_argument('--strains', type=int, default=13, help='Number of strain columns in the truth workbook')
+    parser.add_argument('--genes', type=int, default=4500, help='Genes per genome')
+    parser.add_argument('--truth-genes', type=int, default=4000, help='Rows of the truth workbook')
+    parser.add_argument('--contigs', type=int, default=3, help='Contigs per genome')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the synthetic data')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per stage; the fastest is reported')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for analyze_all_files')
+    parser.add_argument('--work-dir', help='Directory for the synthetic inputs (default: a temporary directory)')
+    parser.add_argument('--keep', action='store_true', help='Keep the synthetic inputs')
+    parser.add_argument('--output', default='benchmark_report.json', help='Path for the JSON report')
+    parser.add_argument('--baseline', help='Earlier JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='Flag stages slower than this multiple of the baseline (default: 1.25)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='pseudogene_bench_')
+
+    try:
+        start = time.perf_counter()
+        dataset = generate_dataset(work_dir, args.genomes, n_strains=args.strains, n_genes=args.genes,
+                                   n_truth=args.truth_genes, n_contigs=args.contigs, seed=args.seed)
+        generate_seconds = time.perf_counter() - start
+        stages = run_benchmarks(dataset, work_dir, args.repeats, args.workers)
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'version': REPORT_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'config': {key: value for key, value in vars(args).items()
+                   if key in ('genomes', 'strains', 'genes', 'truth_genes', 'contigs', 'seed',
+                              'repeats', 'workers')},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'pandas': pd.__version__, 'numpy': np.__version__, 'cpus': os.cpu_count()},
+        'generate_seconds': generate_seconds,
+        'stages': stages,
+    }
+    with open(args.output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+
+    for stage, timing in stages.items():
+        print(f"{stage:26s} {timing['seconds']:9.3f} s  {timing['rows']:>10,} rows")
+    print(f"Report saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare_reports(report, json.load(handle), args.tolerance)
+        for stage, previous, current in regressions:
+            print(f"Regression: {stage} took {current:.3f} s (baseline {previous:.3f} s)")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Locus tags must match BAKTA_LOCUS_TAG_PATTERN in gff_utils for Pseudofinder matching
+LOCUS_PREFIXES = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+DBS_COLUMNS = ['gene_1', 'gene_2', 'delta-bitscore', 'loss_of_function']
+
+
+def genome_id(i):
+    """Return the synthetic GCF accession of genome i"""
+    return f'GCF_{900000000 + i:09d}.1'
+
+
+def locus_tags(i, n_genes):
+    """Return Bakta-style locus tags (six capitals, underscore, five digits) for genome i"""
+    prefix = ''.join(LOCUS_PREFIXES[(i // 26 ** k) % 26] for k in range(6))
+    return np.array([f'{prefix}_{j:05d}' for j in range(n_genes)], dtype=object)
+
+
+def make_layouts(n_strains, n_genes, n_contigs, rng):
+    """
+    Lay out n_genes non-overlapping genes over n_contigs contigs for each truth strain.
+
+    Returns:
+        dict: Strain name to DataFrame with seqname, start, end and pseudo columns
+    """
+    layouts = {}
+    for s in range(n_strains):
+        lengths = rng.integers(300, 3000, n_genes)
+        gaps = rng.integers(20, 400, n_genes)
+        contig = np.sort(rng.integers(0, n_contigs, n_genes))
+        # Restart the running position on every contig
+        steps = lengths + gaps
+        ends = np.cumsum(steps)
+        contig_start = pd.Series(ends - steps).groupby(contig).transform('min').to_numpy()
+        starts = ends - steps - contig_start + 1
+        layouts[f'STRAIN_{s:02d}'] = pd.DataFrame({
+            'seqname': [f'NC_{900000 + s * 10 + c:06d}.1' for c in contig],
+            'start': starts,
+            'end': starts + lengths - 1,
+            'pseudo': rng.random(n_genes) < 0.08,
+        })
+    return layouts
+
+
+def write_nuccio(path, layouts, n_truth, rng):
+    """
+    Write a Nuccio-format truth workbook of the first n_truth genes of every layout.
+
+    Strain columns hold 'status|locus|seqname|start|end', with status 2 for
+    pseudogenes, 1 for intact genes and '3|Absent' for a few missing genes.
+    Some values carry the stray '>' and reversed coordinates seen in the real file.
+    """
+    truth = pd.DataFrame({
+        'Index': np.arange(n_truth),
+        'Reference locus tag(s)': [f'STM{j:04d}' for j in range(n_truth)],
+        'Cross-reference': [f'UniProtKB:P{j:05d} GroupID:G0{j % 6}' for j in range(n_truth)],
+    })
+    for strain, layout in layouts.items():
+        genes = layout.iloc[:n_truth]
+        status = np.where(genes['pseudo'], '2', '1')
+        starts = genes['start'].astype(str).to_numpy(dtype=object)
+        ends = genes['end'].astype(str).to_numpy(dtype=object)
+        reverse = rng.random(n_truth) < 0.5
+        starts, ends = np.where(reverse, ends, starts), np.where(reverse, starts, ends)
+        starts = np.where(rng.random(n_truth) < 0.02, '>' + starts, starts)
+        values = pd.Series(status + '|x|' + genes['seqname'].to_numpy(dtype=object) + '|' + starts + '|' + ends)
+        values[rng.random(n_truth) < 0.03] = '3|Absent'
+        truth[strain] = values.to_numpy()
+    truth.to_excel(path, index=False)
+    return truth
+
+
+def write_anaerobic(path, n_truth):
+    """Write an anaerobic genes workbook listing every ninth truth gene"""
+    pd.DataFrame({'Reference locus tag(s)': [f'STM{j:04d}' for j in range(0, n_truth, 9)]}).to_excel(path, index=False)
+
+
+def _write_gff(path, lines):
+    with open(path, 'w') as handle:
+        handle.write('##gff-version 3\n')
+        handle.write('\n'.join(lines))
+        handle.write('\n')
+
+
+def write_genome(out_dir, i, layout, n_truth, rng):
+    """
+    Write one genome's Bakta GFF3, three Pseudofinder GFFs, DIAMOND outfmt-6 hits
+    and deltaBS results.dbs, all consistent with its truth strain layout.
+
+    Returns:
+        dict: Input kind to path, plus the genome's gcf accession
+    """
+    gcf = genome_id(i)
+    tags = locus_tags(i, len(layout))
+    # Jitter the truth coordinates a little, as a re-annotation would
+    shift = rng.integers(-30, 31, len(layout))
+    starts = np.maximum(layout['start'].to_numpy() + shift, 1)
+    ends = layout['end'].to_numpy() + shift
+    seqnames = layout['seqname'].to_numpy()
+
+    # Callers find most true pseudogenes plus some false positives
+    truth_pseudo = layout['pseudo'].to_numpy()
+    bakta_pseudo = (truth_pseudo & (rng.random(len(layout)) < 0.6)) | (rng.random(len(layout)) < 0.02)
+    paths = {'gcf': gcf}
+
+    lines = []
+    for tag, seqname, start, end, pseudo in zip(tags, seqnames, starts, ends, bakta_pseudo):
+        flag = ';pseudo=True' if pseudo else ''
+        lines.append(f'{seqname}\tBakta\tgene\t{start}\t{end}\t.\t+\t.\tID={tag}_gene;locus_tag={tag}{flag}')
+        lines.append(f'{seqname}\tBakta\tCDS\t{start}\t{end}\t.\t+\t0\tID={tag};Name=hypothetical protein;'
+                     f'locus_tag={tag}{flag}')
+    paths['bakta'] = os.path.join(out_dir, f'{gcf}.bakta.gff3')
+    _write_gff(paths['bakta'], lines)
+
+    for source in ('baktadb', 'salmonella', 'ncbi'):
+        called = np.flatnonzero((truth_pseudo & (rng.random(len(layout)) < 0.5)) |
+                                (rng.random(len(layout)) < 0.03))
+        lines = []
+        for j in called:
+            orf = rng.uniform(5, 100)
+            lines.append(f'{seqnames[j]}\tpseudofinder\tpseudogene\t{starts[j] + 5}\t{ends[j] - 5}\t.\t+\t.\t'
+                         f'note=Pseudogene. ORF is {orf:.1f}% of expected length;'
+                         f'old_locus_tag=Z{j}, {tags[j]}')
+        paths[f'pseudofinder_{source}'] = os.path.join(out_dir, f'{gcf}_{source}_pseudos.gff')
+        _write_gff(paths[f'pseudofinder_{source}'], lines)
+
+    scores = rng.normal(0, 20, len(layout)) + np.where(truth_pseudo, 25, 0)
+    dbs = pd.DataFrame({'gene_1': [f'R{j}' for j in range(len(layout))], 'gene_2': tags,
+                        'delta-bitscore': scores.round(2),
+                        'loss_of_function': (rng.random(len(layout)) < 0.02).astype(int)})
+    paths['dbs'] = os.path.join(out_dir, f'{gcf}.results.dbs')
+    with open(paths['dbs'], 'w') as handle:
+        handle.write('# deltaBS results\n')
+        dbs.to_csv(handle, sep='\t', index=False)
+
+    # Up to four hits per truth gene, the first to its own UniProt entry
+    n_hits = rng.integers(0, 5, n_truth)
+    query = np.repeat(np.arange(n_truth), n_hits)
+    first = np.concatenate([[True], query[1:] != query[:-1]]) if len(query) else np.array([], dtype=bool)
+    subject = np.where(first, query, rng.integers(0, n_truth, len(query)))
+    qlen = rng.integers(100, 1000, len(query))
+    length = (qlen * rng.uniform(0.5, 1.0, len(query))).astype(int)
+    hits = pd.DataFrame({
+        'qseqid': tags[query], 'qlen': qlen,
+        'sseqid': [f'sp|P{s:05d}|PROT_SALTY' for s in subject], 'slen': qlen + rng.integers(-20, 20, len(query)),
+        'pident': rng.uniform(30, 100, len(query)).round(1), 'length': length,
+        'mismatch': rng.integers(0, 30, len(query)), 'gapopen': rng.integers(0, 3, len(query)),
+        'qstart': 1, 'qend': length, 'sstart': 1, 'send': length,
+        'evalue': rng.choice([1e-80, 1e-30, 1e-12, 1e-5], len(query)),
+        'bitscore': np.where(first, 900.0, rng.uniform(50, 800, len(query))).round(1),
+        'gaps': rng.integers(0, 10, len(query)),
+    })
+    paths['raw_diamond'] = os.path.join(out_dir, f'{gcf}.raw_diamond.tsv')
+    hits.to_csv(paths['raw_diamond'], sep='\t', index=False, header=False)
+    return paths
+
+
+def generate_dataset(out_dir, n_genomes, n_strains=13, n_genes=4500, n_truth=4000, n_contigs=3, seed=1):
+    """
+    Generate a synthetic dataset of n_genomes genomes against one truth workbook.
+
+    Genome i follows the gene layout of truth strain i % n_strains, so any number
+    of genomes can be evaluated against a workbook with a realistic number of
+    strain columns.
+
+    Returns:
+        dict: nuccio and anaerobic workbook paths, the genome-to-strain mapping and
+        a list of per-genome input paths from write_genome
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n_truth = min(n_truth, n_genes)
+    layouts = make_layouts(n_strains, n_genes, n_contigs, rng)
+
+    dataset = {'nuccio': os.path.join(out_dir, 'nuccio.xlsx'),
+               'anaerobic': os.path.join(out_dir, 'anaerobic.xlsx')}
+    write_nuccio(dataset['nuccio'], layouts, n_truth, rng)
+    write_anaerobic(dataset['anaerobic'], n_truth)
+
+    strains = list(layouts)
+    dataset['genomes'] = []
+    dataset['strain_mapping'] = {}
+    for i in range(n_genomes):
+        strain = strains[i % n_strains]
+        paths = write_genome(out_dir, i, layouts[strain], n_truth, rng)
+        dataset['genomes'].append(paths)
+        dataset['strain_mapping'][paths['gcf']] = strain
+    return dataset
@@ -0,0 +1,94 @@
+import fcntl
+import hashlib
+import importlib
+import json
+import os
+from contextlib import contextmanager
+
+# Bump when the manifest layout changes so old manifests are not trusted
+MANIFEST_VERSION = 2
+
+
+def file_sha256(file_path, chunk_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Hold an exclusive advisory lock on lock_path for the duration of the block"""
+    with open(lock_path, 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def source_files(script, modules=()):
+    """
+    Return the sources a stage's outputs depend on, so editing them invalidates its manifests.
+
+    Args:
+        script: The stage script's __file__
+        modules: Names of the modules whose code affects the outputs, including
+            those imported indirectly (e.g. overlap_utils through coords_utils)
+    """
+    return [os.path.abspath(script)] + [os.path.abspath(importlib.import_module(name).__file__)
+                                        for name in modules]
+
+
+def stage_manifest_path(output):
+    """Return the manifest path recording how output was made"""
+    return f'{output}.manifest.json'
+
+
+def _stage_record(inputs, params, sources):
+    return {
+        'version': MANIFEST_VERSION,
+        'inputs': {os.path.abspath(path): file_sha256(path) for path in inputs if path},
+        'sources': {path: file_sha256(path) for path in sources},
+        'params': json.loads(json.dumps(params, sort_keys=True, default=str)),
+    }
+
+
+def stage_is_current(manifest_path, inputs, params, sources):
+    """
+    Return True when a stage's recorded outputs can be reused.
+
+    That is when the manifest lists the same input and source file hashes and
+    parameters as now, and every output it lists still exists with the hash it
+    was written with.
+
+    Args:
+        manifest_path: Manifest written by write_stage_manifest
+        inputs: Input file paths (None entries are ignored)
+        params: JSON-serializable parameters that affect the outputs
+        sources: Code the outputs depend on, from source_files
+    """
+    try:
+        with open(manifest_path) as handle:
+            manifest = json.load(handle)
+        record = _stage_record(inputs, params, sources)
+        if any(manifest.get(key) != value for key, value in record.items()):
+            return False
+        outputs = manifest.get('outputs', {})
+        return bool(outputs) and all(os.path.exists(path) and file_sha256(path) == digest
+                                     for path, digest in outputs.items())
+    except (OSError, ValueError):
+        return False
+
+
+def write_stage_manifest(manifest_path, inputs, params, outputs, sources):
+    """Record the input and source hashes, parameters and output hashes of a finished stage"""
+    record = _stage_record(inputs, params, sources)
+    record['outputs'] = {os.path.abspath(path): file_sha256(path) for path in outputs}
+
+    tmp_path = f'{manifest_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as handle:
+        json.dump(record, handle, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
@@ -0,0 +1,24 @@
+def deduplicate_by_consensus(df, key='Index'):
+    """
+    Collapse rows sharing a key into one consensus row per key.
+
+    Descriptive columns take the values of the first row in each group (missing
+    values included), and each *_pseudogene column is 1 if any row in the group
+    has a 1, else 0. Both are computed with grouped operations over the whole
+    table rather than a Python call per group.
+
+    Args:
+        df: DataFrame with one or more rows per key
+        key: Column identifying rows that describe the same gene
+
+    Returns:
+        DataFrame with one row per key, sorted by key, with the key as first column
+    """
+    df = df[df[key].notna()]
+    pseudo_columns = [col for col in df.columns if col.endswith('_pseudogene') and col != key]
+
+    consensus = df.drop_duplicates(subset=key, keep='first').set_index(key).sort_index()
+    flags = df[pseudo_columns].eq(1).groupby(df[key]).any().astype(int)
+    consensus[pseudo_columns] = flags
+
+    return consensus.reset_index()
@@ -0,0 +1,456 @@
+import numpy as np
+import pandas as pd
+
+from dbs_utils import DBS_PERCENTILE, dbs_gene_ids, index_rows, lookup_rows, read_dbs, sweep_thresholds
+from gff_utils import read_gff
+from nuccio_utils import sanitize_coordinates, select_strain_coordinates, split_strain_coordinates
+from overlap_utils import IntervalIndex
+from profiling_utils import NULL_PROFILER
+
+# Mapping dictionary for strain lookups
+STRAIN_MAPPING = {
+    'GCF_000020705.1': 'SL476',
+    'GCF_000020745.1': 'CVM19633',
+    'GCF_000020885.1': 'SL483',
+    'GCF_000009505.1': 'P125109',
+    'GCF_000018705.1': 'SPB7',
+    'GCF_000195995.1': 'CT18',
+    'GCF_000007545.1': 'Ty2',
+    'GCF_000011885.1': 'ATCC 9150',
+    'GCF_000020925.1': 'CT_02021853',
+    'GCF_000009525.1': '287/91',
+    'GCF_000008105.1': 'SC-B67',
+    'GCF_000018385.1': 'RKS4594',
+    'GCF_000026565.1': 'AKU_12601'
+}
+
+SEQNAME_MAPPING = {
+    'GCF_000007545.1': {'contig_1': 'NC_004631.1'},
+    'GCF_000008105.1': {'contig_1': 'NC_006905.1', 'contig_2': 'NC_006855.1', 'contig_3': 'NC_006856.1'},
+    'GCF_000009505.1': {'contig_1': 'NC_011294.1'},
+    'GCF_000009525.1': {'contig_1': 'NC_011274.1'},
+    'GCF_000011885.1': {'contig_1': 'NC_006511.1'},
+    'GCF_000018385.1': {'contig_1': 'NC_012125.1', 'contig_2': 'NC_012124.1'},
+    'GCF_000018705.1': {'contig_1': 'NC_010102.1'},
+    'GCF_000020705.1': {'contig_1': 'NC_011083.1', 'contig_2': 'NC_011082.1', 'contig_3': 'NC_011081.1'},
+    'GCF_000020745.1': {'contig_1': 'NC_011094.1', 'contig_2': 'NC_011092.1', 'contig_3': 'NC_011093.1'},
+    'GCF_000020885.1': {'contig_1': 'NC_011149.1', 'contig_2': 'NC_011148.1'},
+    'GCF_000020925.1': {'contig_1': 'NC_011205.1', 'contig_2': 'NC_011204.1'},
+    'GCF_000026565.1': {'contig_1': 'NC_011147.1'},
+    'GCF_000195995.1': {'contig_1': 'NC_003198.1', 'contig_2': 'NC_003384.1', 'contig_3': 'NC_003385.1'}
+}
+
+def convert_seqnames(seqnames, gcf):
+    """Convert contig names to NC accessions based on GCF"""
+    if gcf in SEQNAME_MAPPING:
+        return seqnames.replace(SEQNAME_MAPPING[gcf])
+    return seqnames
+
+def sanitize_seqnames(values):
+    """
+    Clean seqnames by removing leading '>' and any leading/trailing whitespace;
+    missing values become ''
+    """
+    values = pd.Series(values, dtype=object)
+    return values.fillna('').astype(str).str.strip().str.lstrip('>')
+
+class RegionTable:
+    """
+    Compact store of genomic regions: one row per region, held as arrays.
+
+    Contig names are stored once in contigs and referenced by small integer codes,
+    so a table of a few million features is a handful of arrays instead of
+    millions of Python objects. Regions can be looked up by ID (e.g. the Bakta
+    locus tag) through a mapping from ID to row.
+
+    Attributes:
+        contigs: Array of distinct contig names
+        codes: Contig code (position in contigs) of each region
+        starts, ends: int64 arrays with start <= end
+        ids: Optional array of region IDs
+    """
+
+    def __init__(self, contigs, codes, starts, ends, ids=None):
+        self.contigs = np.asarray(contigs, dtype=object)
+        self.codes = np.asarray(codes, dtype=np.int32)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.ids = None if ids is None else np.asarray(ids, dtype=object)
+        self._rows = None
+
+    @classmethod
+    def from_columns(cls, seqnames, starts, ends, gcf=None, ids=None, label='region'):
+        """
+        Build a table from raw seqname/start/end columns with vectorized sanitation.
+
+        Seqnames are cleaned with sanitize_seqnames (and converted to NC accessions
+        when gcf is given), coordinates with sanitize_coordinates, and start and end
+        ordered so that start <= end. Regions without usable coordinates are
+        skipped with a warning naming them by label (and ID when given).
+        """
+        seqnames = sanitize_seqnames(seqnames)
+        if gcf:
+            seqnames = convert_seqnames(seqnames, gcf)
+        start_coords = sanitize_coordinates(starts).to_numpy()
+        end_coords = sanitize_coordinates(ends).to_numpy()
+
+        valid = ~(np.isnan(start_coords) | np.isnan(end_coords))
+        for position in np.flatnonzero(~valid):
+            name = f" {ids[position]}" if ids is not None else ''
+            print(f"Warning: Skipping {label}{name} with invalid coordinates: "
+                  f"start={np.asarray(starts)[position]}, end={np.asarray(ends)[position]}")
+
+        codes, contigs = pd.factorize(seqnames.to_numpy()[valid])
+        # Truncate like int() does for fractional coordinates
+        lows = np.trunc(np.fmin(start_coords, end_coords)[valid])
+        highs = np.trunc(np.fmax(start_coords, end_coords)[valid])
+        return cls(contigs, codes, lows, highs,
+                   ids=None if ids is None else np.asarray(ids, dtype=object)[valid])
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [])
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def seqnames(self):
+        """Contig name of each region"""
+        return self.contigs[self.codes]
+
+    def take(self, positions):
+        """Return a table of the regions at the given row positions"""
+        return RegionTable(self.contigs, self.codes[positions], self.starts[positions],
+                           self.ends[positions], None if self.ids is None else self.ids[positions])
+
+    def lookup(self, ids):
+        """
+        Return the row of each ID, or -1 for IDs not in the table. When an ID
+        occurs more than once the last row wins.
+        """
+        if self._rows is None:
+            self._rows = index_rows(self.ids if self.ids is not None else [])
+        return lookup_rows(self._rows, ids)
+
+def load_table(source, reader):
+    """Return source if it is already a parsed DataFrame, else read it with reader (None without a path)"""
+    if isinstance(source, pd.DataFrame):
+        return source
+    return reader(source) if source else None
+
+
+def process_bakta_gff(file_path, gcf=None):
+    """
+    Process a Bakta GFF file and return:
+    1. Table of pseudogene regions 
+    2. Table of all CDS/gene features, looked up by gene ID
+    
+    Args:
+        file_path: Path to Bakta GFF file, or the table read_gff returns for it
+        gcf: GCF accession for coordinate conversion
+        
+    Returns:
+        tuple: (RegionTable of pseudogenes, RegionTable of CDS/gene features with IDs)
+    """
+    df = load_table(file_path, read_gff)
+    if df is None:
+        return RegionTable.empty(), RegionTable.empty()
+    
+    # Coordinate table of all CDS/gene features, looked up by ID
+    features = df[df['feature'].isin(['CDS', 'gene']) & df['ID'].notna()]
+    coord_table = RegionTable.from_columns(features['seqname'], features['start'], features['end'],
+                                           gcf=gcf, ids=features['ID'], label='gene')
+    
+    # Track pseudogene regions
+    pseudos = df[df['pseudo']]
+    pseudo_regions = RegionTable.from_columns(pseudos['seqname'], pseudos['start'], pseudos['end'],
+                                              gcf=gcf, label='pseudogene region')
+    
+    return pseudo_regions, coord_table
+
+def process_pseudofinder_gff(file_path, gcf=None):
+    """
+    Process a Pseudofinder GFF file and return its pseudogene regions.
+    Only returns genomic regions marked as pseudogenes, no gene ID mapping needed.
+    
+    Args:
+        file_path: Path to Pseudofinder GFF file, or the table read_gff returns for it
+        gcf: GCF accession for coordinate conversion
+        
+    Returns:
+        RegionTable of pseudogenes
+    """
+    df = load_table(file_path, read_gff)
+    if df is None:
+        return RegionTable.empty()
+    
+    return RegionTable.from_columns(df['seqname'], df['start'], df['end'], gcf=gcf,
+                                    label='Pseudofinder region')
+
+def process_dbs(file_path, coord_table, threshold=None):
+    """
+    Process DBS results file (path or read_dbs table) and extract coordinates using gene ID lookup.
+    Genes scoring above threshold are called; by default the file's own 97.5th percentile.
+    """
+    df = load_table(file_path, read_dbs)
+    if df is None or not coord_table:
+        return RegionTable.empty()
+    
+    # Calculate 97.5th percentile threshold of delta-bitscore
+    if threshold is None:
+        threshold = df['delta-bitscore'].quantile(DBS_PERCENTILE / 100)
+    
+    called = df[df['gene_2'].notna() & (df['delta-bitscore'] > threshold)]
+    gene_ids = dbs_gene_ids(called).to_numpy()
+    rows = coord_table.lookup(gene_ids)
+    for gene_id in gene_ids[rows < 0]:
+        print(f"Warning: Gene ID {gene_id} not found in coordinate dictionary")
+    
+    return coord_table.take(rows[rows >= 0])
+
+def score_overlap_pairs(truth_coords, index):
+    """
+    Find every overlapping truth/call pair and the share of each feature it covers.
+
+    Args:
+        truth_coords: Long-form truth coordinates (seqname, start, end columns)
+        index: IntervalIndex of the calls
+
+    Returns:
+        tuple: (truth positions, call positions, fraction of the truth gene covered,
+                fraction of the call covered), one entry per overlapping pair
+    """
+    truth_starts = truth_coords['start'].to_numpy(dtype=np.int64)
+    truth_ends = truth_coords['end'].to_numpy(dtype=np.int64)
+    truth_pos, call_pos, lengths = index.overlap_lengths(truth_coords['seqname'], truth_starts, truth_ends)
+
+    truth_fraction = lengths / (truth_ends[truth_pos] - truth_starts[truth_pos] + 1)
+    call_fraction = lengths / (index.ends[call_pos] - index.starts[call_pos] + 1)
+    return truth_pos, call_pos, truth_fraction, call_fraction
+
+def passes_overlap(truth_fraction, call_fraction, min_overlap=0.0, reciprocal=False):
+    """
+    Return which pairs meet the overlap cutoff: min_overlap of the truth gene, or of
+    both features when reciprocal is set. A cutoff of 0 accepts any 1 bp overlap.
+    """
+    fraction = np.minimum(truth_fraction, call_fraction) if reciprocal else truth_fraction
+    return fraction >= min_overlap
+
+def calculate_overlaps(truth_df, strain_column, call_sets, strain_coords=None, min_overlap=0.0,
+                       reciprocal=False):
+    """
+    Calculate overlaps between truth data and call sets.
+
+    Each call set is indexed once with an IntervalIndex, so the candidate calls for
+    every truth region are found with binary searches and all overlap lengths are
+    computed with array arithmetic over the candidate pairs.
+
+    Args:
+        truth_df: Truth DataFrame; for each call set, *_pseudogene (match at the
+            cutoff), *_overlap_fraction (best share of the truth gene covered by one
+            call) and *_reciprocal_overlap (best min(truth share, call share)) columns
+            are added in place
+        strain_column: Strain column holding the truth coordinates
+        call_sets: Dict of call set name to RegionTable of calls
+        strain_coords: Pre-split coordinates from process_nuccio; split from
+            truth_df when not given
+        min_overlap, reciprocal: Overlap cutoff, see passes_overlap
+    """
+    if strain_coords is None:
+        strain_coords = split_strain_coordinates(truth_df, [strain_column])
+    truth_coords = select_strain_coordinates(strain_coords, strain_column)
+    rows = truth_coords['row'].to_numpy()
+
+    for call_set_name, calls in call_sets.items():
+        index = IntervalIndex.from_regions(calls)
+        truth_pos, _, truth_fraction, call_fraction = score_overlap_pairs(truth_coords, index)
+        pair_rows = rows[truth_pos]
+
+        hits = np.zeros(len(truth_df), dtype=int)
+        hits[pair_rows[passes_overlap(truth_fraction, call_fraction, min_overlap, reciprocal)]] = 1
+        best_fraction = np.zeros(len(truth_df))
+        np.fmax.at(best_fraction, pair_rows, truth_fraction)
+        best_reciprocal = np.zeros(len(truth_df))
+        np.fmax.at(best_reciprocal, pair_rows, np.minimum(truth_fraction, call_fraction))
+
+        truth_df[f'{call_set_name}_pseudogene'] = hits
+        truth_df[f'{call_set_name}_overlap_fraction'] = best_fraction
+        truth_df[f'{call_set_name}_reciprocal_overlap'] = best_reciprocal
+    
+    return truth_df
+
+# Columns of the call-level table, one row per call (TP/FP) or missed truth pseudogene (FN)
+CALL_LEVEL_COLUMNS = ['call_set', 'classification', 'seqname', 'start', 'end', 'truth_overlaps',
+                      'Index', 'Reference locus tag(s)']
+
+def calculate_call_level(results_df, strain_column, call_sets, strain_coords, min_overlap=0.0,
+                         reciprocal=False):
+    """
+    Classify every call and every truth pseudogene at the call level.
+
+    A call is TP when it overlaps at least one truth pseudogene at the cutoff and FP
+    otherwise, so calls outside the truth table's genes count against PPV. Truth
+    pseudogenes no call overlaps are FN. Each call set is indexed once per contig
+    and the truth pseudogenes are resolved against it by binary search.
+
+    Args:
+        results_df: Output of calculate_overlaps, with a *_pseudogene column per call set
+        strain_column: Strain column holding the truth coordinates
+        call_sets: Dict of call set name to RegionTable of calls
+        strain_coords: Pre-split coordinates from process_nuccio
+        min_overlap, reciprocal: Overlap cutoff, see passes_overlap
+
+    Returns:
+        DataFrame with CALL_LEVEL_COLUMNS; Index and Reference locus tag(s) are
+        only set for FN rows
+    """
+    truth_coords = select_strain_coordinates(strain_coords, strain_column)
+    truth_mask = results_df[strain_column].astype(str).str.startswith('2').to_numpy()
+    truth_coords = truth_coords[truth_mask[truth_coords['row'].to_numpy()]]
+    coords_by_row = truth_coords.set_index('row')[['seqname', 'start', 'end']]
+
+    tables = []
+    for call_set_name, calls in call_sets.items():
+        index = IntervalIndex.from_regions(calls)
+        _, call_pos, truth_fraction, call_fraction = score_overlap_pairs(truth_coords, index)
+        passing = passes_overlap(truth_fraction, call_fraction, min_overlap, reciprocal)
+        overlaps = np.bincount(call_pos[passing], minlength=len(calls))
+        tables.append(pd.DataFrame({
+            'call_set': call_set_name,
+            'classification': np.where(overlaps > 0, 'TP', 'FP'),
+            'seqname': calls.seqnames,
+            'start': index.starts,
+            'end': index.ends,
+            'truth_overlaps': overlaps
+        }))
+
+        # Missed truth pseudogenes, as flagged by calculate_overlaps
+        missed = np.flatnonzero(truth_mask & (results_df[f'{call_set_name}_pseudogene'].to_numpy() == 0))
+        missed_coords = coords_by_row.reindex(missed)
+        tables.append(pd.DataFrame({
+            'call_set': call_set_name,
+            'classification': 'FN',
+            'seqname': missed_coords['seqname'].to_numpy(),
+            'start': missed_coords['start'].to_numpy(),
+            'end': missed_coords['end'].to_numpy(),
+            'truth_overlaps': 0,
+            'Index': results_df['Index'].to_numpy()[missed],
+            'Reference locus tag(s)': results_df['Reference locus tag(s)'].to_numpy()[missed]
+        }))
+
+    if not tables:
+        return pd.DataFrame(columns=CALL_LEVEL_COLUMNS)
+    return pd.concat(tables, ignore_index=True)[CALL_LEVEL_COLUMNS]
+
+def summarize_call_level(call_level):
+    """Count TP/FP calls and FN truth pseudogenes per call set, with call-level PPV"""
+    counts = (pd.crosstab(call_level['call_set'], call_level['classification'])
+              .reindex(columns=['TP', 'FP', 'FN'], fill_value=0))
+    summary = counts.rename(columns={'TP': 'true_positives', 'FP': 'false_positives',
+                                     'FN': 'false_negatives'}).rename_axis(columns=None).reset_index()
+    called = summary['true_positives'] + summary['false_positives']
+    summary['ppv'] = (summary['true_positives'] / called.where(called > 0)).fillna(0)
+    return summary
+
+def sweep_dbs(truth_df, strain_column, strain_coords, file_path, coord_table, min_overlap=0.0,
+              reciprocal=False):
+    """
+    Sweep the DBS delta-bitscore cutoff for one strain against the truth data.
+
+    Every DBS gene with coordinates is matched to the truth regions it overlaps at the
+    cutoff (see passes_overlap), and
+    each truth gene gets the best delta-bitscore among its matches. Sensitivity and
+    PPV at every candidate cutoff are then computed in one pass by sweep_thresholds.
+    Cutoff percentiles are taken over the whole delta-bitscore column, as in
+    process_dbs.
+
+    Returns:
+        DataFrame: Curve table from dbs_utils.sweep_thresholds
+    """
+    df = load_table(file_path, read_dbs)
+    all_scores = df['delta-bitscore']
+    df = df[df['gene_2'].notna()]
+    rows = coord_table.lookup(dbs_gene_ids(df))
+    known = rows >= 0
+
+    regions = coord_table.take(rows[known])
+    scores = df['delta-bitscore'].to_numpy(dtype=float)[known]
+
+    truth_coords = select_strain_coordinates(strain_coords, strain_column)
+    index = IntervalIndex.from_regions(regions)
+    truth_pos, call_pos, truth_fraction, call_fraction = score_overlap_pairs(truth_coords, index)
+    passing = passes_overlap(truth_fraction, call_fraction, min_overlap, reciprocal)
+    truth_pos, call_pos = truth_pos[passing], call_pos[passing]
+
+    gene_scores = np.full(len(truth_df), -np.inf)
+    np.fmax.at(gene_scores, truth_coords['row'].to_numpy()[truth_pos], scores[call_pos])
+
+    truth_mask = truth_df[strain_column].astype(str).str.startswith('2').to_numpy()
+    return sweep_thresholds(gene_scores, truth_mask, all_scores)
+
+def evaluate_strain(truth_df, strain_coords, gcf, bakta=None, pseudofinder_baktadb=None,
+                    pseudofinder_salmonella=None, pseudofinder_ncbi=None, dbs=None,
+                    dbs_sweep=False, min_overlap=0.0, reciprocal=False, dbs_threshold=None,
+                    profiler=None):
+    """
+    Evaluate one strain's call sets against the truth data.
+
+    Args:
+        truth_df: Truth DataFrame with the central_anaerobic_metabolism column; not modified
+        strain_coords: Pre-split strain coordinates from process_nuccio
+        gcf: GCF accession of the strain
+        bakta, pseudofinder_*, dbs: Paths to the call files, or their parsed tables (optional)
+        dbs_sweep: Also sweep the DBS cutoff (needs bakta and dbs)
+        min_overlap, reciprocal: Overlap cutoff for a call to match a truth gene,
+            see passes_overlap
+        dbs_threshold: Delta-bitscore cutoff for DBS calls, e.g. from
+            dbs_utils.pooled_dbs_threshold (default: the DBS file's own percentile)
+        profiler: StageProfiler for the gff_parse, dbs_parse, overlap and dbs_sweep stages
+
+    Returns:
+        tuple: (truth_df with a *_pseudogene column per non-empty call set,
+                call-level TP/FP/FN table from calculate_call_level,
+                DBS threshold curve or None)
+    """
+    if gcf not in STRAIN_MAPPING:
+        raise ValueError(f"Unknown GCF accession: {gcf}")
+    strain = STRAIN_MAPPING[gcf]
+    profiler = profiler or NULL_PROFILER
+
+    with profiler.stage('gff_parse') as stage:
+        # Process Bakta GFF file to get both pseudogenes and the gene coordinate table
+        bakta_regions, coord_table = process_bakta_gff(bakta, gcf=gcf)
+
+        # Process all call sets and store their coordinates
+        call_sets = {
+            'bakta': bakta_regions,
+            'pseudofinder_baktadb': process_pseudofinder_gff(pseudofinder_baktadb, gcf=gcf),
+            'pseudofinder_salmonella': process_pseudofinder_gff(pseudofinder_salmonella, gcf=gcf),
+            'pseudofinder_ncbi': process_pseudofinder_gff(pseudofinder_ncbi, gcf=gcf),
+        }
+        stage['rows'] = len(coord_table) + sum(len(calls) for calls in call_sets.values())
+
+    with profiler.stage('dbs_parse') as stage:
+        dbs = load_table(dbs, read_dbs)
+        call_sets['dbs'] = process_dbs(dbs, coord_table, dbs_threshold)
+        stage['rows'] = 0 if dbs is None else len(dbs)
+    
+    # Remove empty call sets
+    call_sets = {k: v for k, v in call_sets.items() if v}
+    
+    # Calculate overlaps and update truth dataframe
+    with profiler.stage('overlap') as stage:
+        results_df = calculate_overlaps(truth_df.copy(), strain, call_sets, strain_coords,
+                                        min_overlap, reciprocal)
+        call_level = calculate_call_level(results_df, strain, call_sets, strain_coords,
+                                          min_overlap, reciprocal)
+        stage['rows'] = len(call_level)
+
+    dbs_curve = None
+    if dbs_sweep and dbs is not None and coord_table:
+        with profiler.stage('dbs_sweep') as stage:
+            dbs_curve = sweep_dbs(truth_df, strain, strain_coords, dbs, coord_table,
+                                  min_overlap, reciprocal)
+            stage['rows'] = len(dbs_curve)
+    return results_df, call_level, dbs_curve
@@ -0,0 +1,280 @@
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache_utils import file_sha256
+
+# DBS calls are genes whose delta-bitscore is above this percentile
+DBS_PERCENTILE = 97.5
+
+# Relative accuracy of QuantileSketch estimates; bump SKETCH_VERSION when the
+# sketch layout changes so cached sketches are rebuilt
+SKETCH_ACCURACY = 0.005
+SKETCH_VERSION = 1
+
+
+# GFF attributes are split into this many attribute_N columns by annotate_dbs
+N_ATTRIBUTES = 10
+
+
+def read_dbs(file_path):
+    """Read a deltaBS results.dbs file (the first line is a comment), or an Excel copy of one"""
+    if str(file_path).endswith(('.xlsx', '.xls')):
+        return pd.read_excel(file_path)
+    return pd.read_csv(file_path, sep='\t', skiprows=1)
+
+
+def dbs_gene_ids(df):
+    """Return the gene ID of each DBS row (gene_2 up to the first '|')"""
+    return df['gene_2'].astype(str).str.split('|').str[0]
+
+
+def index_rows(keys):
+    """Return a Series mapping each distinct key to its row position; repeated keys map to their last row"""
+    keys = pd.Index(np.asarray(keys, dtype=object))
+    rows = pd.Series(np.arange(len(keys)), index=keys)
+    return rows[~keys.duplicated(keep='last')]
+
+
+def lookup_rows(row_index, keys):
+    """Return the row of each key in an index_rows Series, or -1 for unknown keys"""
+    return row_index.index.get_indexer(np.asarray(keys, dtype=object))
+
+
+def annotate_dbs(dbs_df, gff_df, key='locus_tag', features=('CDS',), n_attributes=N_ATTRIBUTES):
+    """
+    Annotate every DBS row with the GFF feature of its gene in one indexed join.
+
+    The features are indexed once on key and all DBS gene IDs (see dbs_gene_ids)
+    are resolved with a single lookup. Rows without a matching feature keep
+    empty annotation columns, as in a left join; when a key occurs more than once
+    the last feature is used.
+
+    Args:
+        dbs_df: Table from read_dbs
+        gff_df: Table from gff_utils.read_gff
+        key: GFF column the DBS gene IDs refer to ('locus_tag' or 'ID')
+        features: GFF feature types to index
+        n_attributes: Number of attribute_N columns the attribute string is split
+            into on ';' (extra pieces are dropped)
+
+    Returns:
+        DataFrame: dbs_df columns, then seqname, source, feature, start, end, score,
+        strand, frame and attribute_1..attribute_N
+    """
+    indexed = gff_df[gff_df['feature'].isin(features) & gff_df[key].notna()].reset_index(drop=True)
+    rows = lookup_rows(index_rows(indexed[key]), dbs_gene_ids(dbs_df))
+
+    matched = indexed.reindex(rows)
+    annotation = matched[['seqname', 'source', 'feature', 'start', 'end', 'score', 'strand', 'frame']]
+    for column in ('start', 'end'):
+        if pd.api.types.is_numeric_dtype(annotation[column]):
+            annotation = annotation.assign(**{column: annotation[column].astype('Int64')})
+
+    attributes = matched['attribute'].astype(object).str.split(';', expand=True)
+    attributes = attributes.reindex(columns=range(n_attributes))
+    attributes.columns = [f'attribute_{i + 1}' for i in range(n_attributes)]
+
+    return pd.concat([dbs_df.reset_index(drop=True), annotation.reset_index(drop=True),
+                      attributes.reset_index(drop=True)], axis=1)
+
+
+def sweep_thresholds(gene_scores, truth_mask, candidate_scores):
+    """
+    Score DBS calls against the truth at every candidate delta-bitscore threshold.
+
+    A gene is called at threshold t when its score is > t, as in process_dbs. Gene
+    scores are sorted once; true and false positive counts for every threshold are
+    then read off cumulative sums with one binary search per threshold.
+
+    Args:
+        gene_scores: Best delta-bitscore of the DBS calls matched to each truth-table
+            gene (NaN or -inf when no call matches)
+        truth_mask: Boolean array, True for truth pseudogenes
+        candidate_scores: Delta-bitscores to use as thresholds, typically every
+            score in the results.dbs file
+
+    Returns:
+        DataFrame with one row per distinct threshold (ascending): threshold,
+        percentile (share of candidate scores <= threshold), called, true_positives,
+        false_positives, false_negatives, sensitivity, ppv, f1 and optimal
+        (True for the threshold with the highest F1)
+    """
+    gene_scores = np.asarray(gene_scores, dtype=float)
+    truth_mask = np.asarray(truth_mask, dtype=bool)
+    candidate_scores = np.asarray(candidate_scores, dtype=float)
+    candidate_scores = np.sort(candidate_scores[~np.isnan(candidate_scores)])
+
+    scored = np.isfinite(gene_scores)
+    order = np.argsort(gene_scores[scored], kind='stable')
+    sorted_scores = gene_scores[scored][order]
+    truth_cumsum = np.concatenate([[0], np.cumsum(truth_mask[scored][order])])
+
+    thresholds = np.unique(candidate_scores)
+    below = np.searchsorted(sorted_scores, thresholds, side='right')
+    called = len(sorted_scores) - below
+    true_positives = truth_cumsum[-1] - truth_cumsum[below]
+    false_positives = called - true_positives
+    false_negatives = truth_mask.sum() - true_positives
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sensitivity = np.where(true_positives + false_negatives > 0,
+                               true_positives / (true_positives + false_negatives), 0.0)
+        ppv = np.where(called > 0, true_positives / called, 0.0)
+        f1 = np.where(sensitivity + ppv > 0, 2 * sensitivity * ppv / (sensitivity + ppv), 0.0)
+
+    curve = pd.DataFrame({
+        'threshold': thresholds,
+        'percentile': np.searchsorted(candidate_scores, thresholds, side='right') / max(len(candidate_scores), 1) * 100,
+        'called': called,
+        'true_positives': true_positives,
+        'false_positives': false_positives,
+        'false_negatives': false_negatives,
+        'sensitivity': sensitivity,
+        'ppv': ppv,
+        'f1': f1
+    })
+    curve['optimal'] = False
+    if len(curve):
+        curve.loc[curve['f1'].idxmax(), 'optimal'] = True
+    return curve
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative accuracy (the DDSketch bucketing).
+
+    Each value x is counted in the logarithmic bucket ceil(log_gamma(|x|)), with
+    gamma = (1 + accuracy) / (1 - accuracy), kept separately for positive and
+    negative values; values closer to 0 than MIN_VALUE are counted as zero. Every
+    ranked value is recovered within accuracy * |value|, and quantiles
+    interpolate between ranks as Series.quantile does, so an estimate is within
+    accuracy of the magnitudes of the two values either side of it. Two
+    sketches merge exactly by adding bucket counts, so per-file sketches can be
+    pooled without re-reading the files.
+    """
+
+    MIN_VALUE = 1e-9
+
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+
+    @classmethod
+    def from_values(cls, values, accuracy=SKETCH_ACCURACY):
+        """Build a sketch of the finite values in an array"""
+        sketch = cls(accuracy)
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        small = np.abs(values) < cls.MIN_VALUE
+        sketch.zero_count = int(small.sum())
+        for store, part in ((sketch.positive, values[~small & (values > 0)]),
+                            (sketch.negative, -values[~small & (values < 0)])):
+            keys, counts = np.unique(np.ceil(np.log(part) / np.log(sketch.gamma)).astype(np.int64),
+                                     return_counts=True)
+            store.update(zip(keys.tolist(), counts.tolist()))
+        return sketch
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.positive.values()) + sum(self.negative.values())
+
+    def merge(self, other):
+        """Add another sketch's counts to this one (both must have the same accuracy)"""
+        if other.accuracy != self.accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zero_count += other.zero_count
+        return self
+
+    def quantile(self, q):
+        """Estimate the q quantile (0 <= q <= 1), or NaN for an empty sketch"""
+        total = self.count
+        if total == 0:
+            return float('nan')
+        rank = q * (total - 1)
+
+        # Buckets in value order: negatives from the largest magnitude, zero, positives
+        buckets = [(-1, key, count) for key, count in sorted(self.negative.items(), reverse=True)]
+        buckets.append((0, 0, self.zero_count))
+        buckets += [(1, key, count) for key, count in sorted(self.positive.items())]
+
+        # Interpolate linearly between the values at the ranks either side, as
+        # pandas' default quantile does on the raw values
+        lower = math.floor(rank)
+        upper = min(lower + 1, total - 1)
+        values = []
+        seen = 0
+        for sign, key, count in buckets:
+            seen += count
+            while len(values) < 2 and seen > (lower, upper)[len(values)]:
+                values.append(sign * 2 * self.gamma ** key / (self.gamma + 1))
+            if len(values) == 2:
+                break
+        return values[0] + (rank - lower) * (values[1] - values[0])
+
+    def to_dict(self):
+        return {'version': SKETCH_VERSION, 'accuracy': self.accuracy, 'zero_count': self.zero_count,
+                'positive': sorted(self.positive.items()), 'negative': sorted(self.negative.items())}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['accuracy'])
+        sketch.zero_count = data['zero_count']
+        sketch.positive = {int(key): count for key, count in data['positive']}
+        sketch.negative = {int(key): count for key, count in data['negative']}
+        return sketch
+
+
+def load_dbs_sketch(file_path, cache_dir=None, accuracy=SKETCH_ACCURACY):
+    """
+    Return the QuantileSketch of a results.dbs file's delta-bitscores.
+
+    The file is read once; its sketch is cached as JSON keyed on the file's
+    SHA-256, so editing the file invalidates it automatically.
+
+    Args:
+        file_path: Path to a results.dbs file
+        cache_dir: Cache directory (default: .dbs_sketch_cache next to the file)
+        accuracy: Relative accuracy of the sketch
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), '.dbs_sketch_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    cache_path = os.path.join(cache_dir, f'{stem}.v{SKETCH_VERSION}.a{accuracy}.{file_sha256(file_path)[:16]}.json')
+    if os.path.exists(cache_path):
+        with open(cache_path) as handle:
+            return QuantileSketch.from_dict(json.load(handle))
+
+    sketch = QuantileSketch.from_values(read_dbs(file_path)['delta-bitscore'], accuracy)
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as handle:
+        json.dump(sketch.to_dict(), handle)
+    os.replace(tmp_path, cache_path)
+    return sketch
+
+
+def pooled_dbs_threshold(file_paths, percentile=DBS_PERCENTILE, cache_dir=None):
+    """
+    Return the delta-bitscore percentile over all rows of many results.dbs files.
+
+    Per-file sketches (see load_dbs_sketch) are merged, so adding a strain only
+    reads the new file.
+
+    Returns:
+        tuple: (threshold, number of delta-bitscores pooled)
+    """
+    pooled = QuantileSketch()
+    for file_path in file_paths:
+        pooled.merge(load_dbs_sketch(file_path, cache_dir))
+    return pooled.quantile(percentile / 100), pooled.count
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from consensus_utils import deduplicate_by_consensus
+from coords_utils import load_table
+from dbs_utils import DBS_PERCENTILE, read_dbs
+from gff_utils import read_gff
+from profiling_utils import NULL_PROFILER
+
+def process_bakta(file_path):
+    """Process the bakta GFF file (path or read_gff table) to get pseudo genes"""
+    df = load_table(file_path, read_gff)
+    return df.loc[df['pseudo'], 'locus_tag'].tolist()
+
+def process_pseudofinder(file_path):
+    """Process the pseudofinder calls (path or read_gff table) to get matching locus tags"""
+    df = load_table(file_path, read_gff)
+    if df is None:
+        return []
+        
+    return df['matching_locus_tag'].dropna().tolist()
+
+def process_diamond(file_path):
+    """Process reciprocal diamond file"""
+    df = pd.read_csv(file_path, sep='\t')
+    return df[['qseqid', 'protein_id']]
+
+def calculate_dbs_threshold(dbs_values):
+    """Calculate the 97.5th percentile threshold for delta-bit-scores"""
+    return np.percentile(dbs_values.dropna(), DBS_PERCENTILE)
+
+def is_dbs_pseudogene(row, threshold):
+    """
+    Determine if a gene is a pseudogene based on DBS criteria:
+    1. Delta-bit-score > threshold OR
+    2. loss_of_function = 1
+    """
+    if pd.isnull(row['delta-bitscore']):
+        return 0
+    return 1 if (row['delta-bitscore'] > threshold) else 0
+
+def build_diamond_table(nuccio_df, diamond_df, anaerobic_genes, bakta=None, pseudofinder_baktadb=None,
+                        pseudofinder_salmonella=None, pseudofinder_ncbi=None, dbs=None, dbs_threshold=None,
+                        profiler=None):
+    """
+    Join the call sets to the truth data through the DIAMOND best hits.
+
+    Args:
+        nuccio_df: Truth DataFrame with a UniProtKB_ID column
+        diamond_df: DIAMOND best hits from process_diamond
+        anaerobic_genes: Locus tags of the central anaerobic metabolism genes
+        bakta, pseudofinder_*: Paths to the GFF files, or their read_gff tables (optional)
+        dbs: Path to the DBS results file, or its read_dbs table (optional)
+        dbs_threshold: Delta-bitscore cutoff for DBS calls, e.g. from
+            dbs_utils.pooled_dbs_threshold (default: the 97.5th percentile of the
+            joined rows)
+        profiler: StageProfiler for the gff_parse, join, dbs_join and consensus stages
+
+    Returns:
+        tuple: (complete table, consensus-deduplicated table, DBS threshold or None)
+    """
+    profiler = profiler or NULL_PROFILER
+
+    with profiler.stage('gff_parse') as stage:
+        # Process Bakta if provided
+        bakta_pseudos = process_bakta(bakta) if bakta is not None else None
+    
+        # Process each Pseudofinder result
+        pseudofinder_results = {
+            'baktadb': process_pseudofinder(pseudofinder_baktadb),
+            'salmonella': process_pseudofinder(pseudofinder_salmonella),
+            'ncbi': process_pseudofinder(pseudofinder_ncbi)
+        }
+        stage['rows'] = len(bakta_pseudos or []) + sum(len(pseudos) for pseudos in pseudofinder_results.values())
+
+    with profiler.stage('join') as stage:
+        # Initial merge of nuccio and diamond data
+        merged_df = pd.merge(nuccio_df, diamond_df, 
+                            left_on='UniProtKB_ID', 
+                            right_on='protein_id', 
+                            how='left')
+    
+        # Add anaerobic metabolism column
+        merged_df['central_anaerobic_metabolism'] = merged_df['Reference locus tag(s)'].isin(anaerobic_genes).astype(int)
+    
+        if bakta_pseudos is not None:
+            merged_df['bakta_pseudogene'] = merged_df['qseqid'].isin(bakta_pseudos).astype(int)
+    
+        # Add columns for each Pseudofinder result
+        for source, pseudos in pseudofinder_results.items():
+            merged_df[f'pseudofinder_{source}_pseudogene'] = merged_df['qseqid'].isin(pseudos).astype(int)
+        stage['rows'] = len(merged_df)
+    
+    # Process DBS if provided
+    with profiler.stage('dbs_join') as stage:
+        dbs_results = load_table(dbs, read_dbs)
+        stage['rows'] = 0 if dbs_results is None else len(dbs_results)
+        if dbs_results is not None:
+            # Merge DBS results
+            merged_df = pd.merge(merged_df, dbs_results[['gene_2', 'delta-bitscore', 'loss_of_function']],
+                               left_on='qseqid',
+                               right_on='gene_2',
+                               how='left')
+        
+            # Calculate DBS threshold and add DBS pseudogene column
+            if dbs_threshold is None:
+                dbs_threshold = calculate_dbs_threshold(merged_df['delta-bitscore'])
+            merged_df['dbs_pseudogene'] = merged_df.apply(
+                lambda row: is_dbs_pseudogene(row, dbs_threshold), axis=1
+            )
+        
+            # Clean up temporary DBS columns
+            merged_df.drop(['gene_2', 'delta-bitscore', 'loss_of_function'], axis=1, inplace=True)
+        else:
+            dbs_threshold = None
+    
+    # Create consensus-based deduplicated dataframe
+    with profiler.stage('consensus') as stage:
+        dedup_df = deduplicate_by_consensus(merged_df, key='Index')
+        stage['rows'] = len(dedup_df)
+    return merged_df, dedup_df, dbs_threshold
@@ -0,0 +1,49 @@
+import pandas as pd
+
+GFF_COLUMNS = ['seqname', 'source', 'feature', 'start', 'end',
+               'score', 'strand', 'frame', 'attribute']
+
+# Bakta-style locus tags (e.g. ABCDEF_00001) as listed in Pseudofinder old_locus_tag attributes
+BAKTA_LOCUS_TAG_PATTERN = r'[A-Z]{6}_\d{5}'
+
+
+def extract_attribute(attributes, key):
+    """Extract the value of a GFF attribute key from a Series of attribute strings"""
+    return attributes.str.extract(rf'{key}=([^;]+)', expand=False)
+
+
+def extract_matching_locus_tag(old_locus_tags):
+    """
+    Return the first comma-separated entry of each old_locus_tag value that
+    looks like a Bakta locus tag, or NaN when none does.
+    """
+    return old_locus_tags.str.extract(rf'(?:^|,)(\s*{BAKTA_LOCUS_TAG_PATTERN}[^,]*)', expand=False)
+
+
+def read_gff(file_path):
+    """
+    Read a GFF3 file and parse the attributes used by the pipeline into typed columns.
+
+    Attribute parsing is done column-wise with vectorized string extraction, so the
+    cost is a single pass over the file rather than one regex call per feature.
+
+    Args:
+        file_path: Path to a Bakta or Pseudofinder GFF file
+
+    Returns:
+        DataFrame with the nine GFF columns plus:
+            ID, locus_tag, old_locus_tag: attribute values (NaN when absent)
+            matching_locus_tag: first Bakta-style entry in old_locus_tag
+            pseudo: True when the attributes contain pseudo=True
+    """
+    df = pd.read_csv(file_path, sep='\t', comment='#', header=None,
+                     names=GFF_COLUMNS, low_memory=False)
+
+    attributes = df['attribute'].astype(object)
+    df['ID'] = extract_attribute(attributes, 'ID')
+    df['locus_tag'] = extract_attribute(attributes, 'locus_tag')
+    df['old_locus_tag'] = extract_attribute(attributes, 'old_locus_tag')
+    df['matching_locus_tag'] = extract_matching_locus_tag(df['old_locus_tag'])
+    df['pseudo'] = attributes.str.contains('pseudo=True', regex=False, na=False)
+
+    return df
@@ -0,0 +1,162 @@
+import os
+
+import pandas as pd
+
+from cache_utils import file_sha256
+
+# Bump when the parsed layout changes so stale caches are not reused
+CACHE_VERSION = 1
+
+UNIPROT_PATTERN = r'UniProtKB:([A-Z0-9]+)'
+
+# Strain columns hold values like '2|...|seqname|start|end' or '3|Absent'
+STRAIN_VALUE_PATTERN = r'\d\|'
+
+
+def find_strain_columns(df):
+    """Return the columns of the truth table that hold strain coordinate strings"""
+    strain_columns = []
+    for col in df.columns:
+        values = df[col].astype(object)
+        if pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'mixed'):
+            continue
+        if values.str.match(STRAIN_VALUE_PATTERN, na=False).any():
+            strain_columns.append(col)
+    return strain_columns
+
+
+def split_strain_coordinates(df, strain_columns):
+    """
+    Split strain columns of the truth table into a long-form coordinate table.
+
+    Values are parsed as 'status|...|seqname|start|end'. Seqnames are stripped of
+    whitespace and leading '>', coordinates of any non-numeric characters, and start
+    and end are ordered so that start <= end. Rows without usable coordinates
+    (e.g. '3|Absent') are dropped.
+
+    Returns:
+        DataFrame with columns row (position in df), strain, status, seqname, start, end
+    """
+    tables = []
+    for strain in strain_columns:
+        parts = df[strain].astype(object).str.split('|')
+        coords = pd.DataFrame({
+            'row': range(len(df)),
+            'strain': strain,
+            'status': parts.str[0],
+            'seqname': parts.str[2].str.strip().str.lstrip('>'),
+            'start': sanitize_coordinates(parts.str[3]),
+            'end': sanitize_coordinates(parts.str[4]),
+        })
+        coords = coords[coords['seqname'].notna() &
+                        coords['start'].notna() & coords['end'].notna()]
+
+        starts = coords[['start', 'end']].min(axis=1)
+        ends = coords[['start', 'end']].max(axis=1)
+        coords = coords.assign(start=starts.astype('int64'), end=ends.astype('int64'))
+        tables.append(coords)
+
+    if not tables:
+        return pd.DataFrame({'row': pd.Series(dtype='int64'), 'strain': pd.Series(dtype=object),
+                             'status': pd.Series(dtype=object), 'seqname': pd.Series(dtype=object),
+                             'start': pd.Series(dtype='int64'), 'end': pd.Series(dtype='int64')})
+    return pd.concat(tables, ignore_index=True)
+
+
+def select_strain_coordinates(strain_coords, strain_column):
+    """
+    Return the rows of the long-form coordinate table for one strain.
+
+    Raises a ValueError when the strain has none, e.g. a column missing from the
+    truth table or holding only '3|Absent' values, rather than letting every
+    call set silently score zero overlaps.
+    """
+    truth_coords = strain_coords[strain_coords['strain'] == strain_column]
+    if truth_coords.empty:
+        raise ValueError(f"No usable coordinates for strain column '{strain_column}' in the Nuccio "
+                         f"table; expected values like 'status|...|seqname|start|end'")
+    return truth_coords
+
+
+def sanitize_coordinates(values):
+    """
+    Parse coordinates after dropping every character except digits, '-' and '.'.
+    Unparseable values become NaN; numeric columns are passed through as floats.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    # Missing values become 'nan'/'None', which clean to '' and parse as NaN
+    cleaned = values.astype(str).str.replace(r'[^\d.-]', '', regex=True)
+    return pd.to_numeric(cleaned, errors='coerce')
+
+
+def parse_nuccio(file_path):
+    """
+    Read the Nuccio truth workbook and derive the columns used downstream.
+
+    Returns:
+        tuple: (truth DataFrame with a UniProtKB_ID column, long-form strain coordinates)
+    """
+    df = pd.read_excel(file_path)
+    df['UniProtKB_ID'] = df['Cross-reference'].astype(object).str.extract(UNIPROT_PATTERN, expand=False)
+    strain_coords = split_strain_coordinates(df, find_strain_columns(df))
+    return df, strain_coords
+
+
+def _write_table(df, path_stem):
+    """Write a cached table as Parquet, falling back to pickle for tables Parquet can't hold"""
+    tmp_path = f'{path_stem}.{os.getpid()}.tmp'
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, f'{path_stem}.parquet')
+    except (ImportError, ValueError, TypeError):
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, f'{path_stem}.pkl')
+
+
+def _read_table(path_stem):
+    """Read a cached table written by _write_table, or return None if there is none"""
+    if os.path.exists(f'{path_stem}.parquet'):
+        return pd.read_parquet(f'{path_stem}.parquet')
+    if os.path.exists(f'{path_stem}.pkl'):
+        return pd.read_pickle(f'{path_stem}.pkl')
+    return None
+
+
+def load_nuccio(file_path, cache_dir=None, use_cache=True):
+    """
+    Load the parsed Nuccio truth workbook, reusing a cached copy when possible.
+
+    The cache is keyed on the workbook's SHA-256, so editing the workbook
+    invalidates it automatically. Parsed tables are stored as Parquet.
+
+    Args:
+        file_path: Path to the Nuccio Excel file
+        cache_dir: Cache directory (default: .nuccio_cache next to the workbook)
+        use_cache: Set to False to always parse the workbook
+
+    Returns:
+        tuple: (truth DataFrame with a UniProtKB_ID column, long-form strain coordinates)
+    """
+    if not use_cache:
+        return parse_nuccio(file_path)
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), '.nuccio_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    key = f'{stem}.v{CACHE_VERSION}.{file_sha256(file_path)[:16]}'
+    truth_stem = os.path.join(cache_dir, f'{key}.truth')
+    coords_stem = os.path.join(cache_dir, f'{key}.coords')
+
+    truth_df = _read_table(truth_stem)
+    strain_coords = _read_table(coords_stem)
+    if truth_df is not None and strain_coords is not None:
+        return truth_df, strain_coords
+
+    truth_df, strain_coords = parse_nuccio(file_path)
+    _write_table(truth_df, truth_stem)
+    _write_table(strain_coords, coords_stem)
+    return truth_df, strain_coords
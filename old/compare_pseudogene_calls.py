@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 import argparse
 from typing import List, Tuple, Dict
 import os
@@ -253,6 +254,125 @@ def process_datasets(truth_file: str, genome_accession: str, call_files: List[Di
     
     return pd.DataFrame(results), all_calls
 
+def extract_orf_percentages(df: pd.DataFrame) -> pd.Series:
+    """
+    Extract the 'ORF is X%' value of every call into a numeric column.
+
+    Calls without an ORF percentage get -inf, so they pass every cutoff, as in
+    filter_pseudofinder_calls.
+    """
+    if 'attribute' not in df.columns:
+        return pd.Series(-np.inf, index=df.index)
+    percentages = df['attribute'].astype(object).str.extract(r'ORF is (\d+\.?\d*)%', expand=False)
+    return pd.to_numeric(percentages, errors='coerce').fillna(-np.inf)
+
+def find_overlap_pairs(truth_df: pd.DataFrame, call_df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find all (truth, call) pairs that satisfy is_overlap on the same seqname.
+
+    Calls are sorted by start per seqname, so each truth region's candidates are
+    found by binary search instead of a scan over every call.
+
+    Returns:
+        Positional indices into truth_df and call_df for each overlapping pair
+    """
+    truth_seqnames = truth_df['seqname'].to_numpy()
+    truth_starts = truth_df['start'].to_numpy(dtype=float)
+    truth_ends = truth_df['stop'].to_numpy(dtype=float)
+    call_seqnames = call_df['seqname'].to_numpy()
+    call_starts = call_df['start'].to_numpy(dtype=float)
+    call_ends = call_df['end'].to_numpy(dtype=float)
+
+    truth_parts, call_parts = [], []
+    for seqname in pd.unique(truth_seqnames):
+        calls = np.flatnonzero(call_seqnames == seqname)
+        if len(calls) == 0:
+            continue
+        calls = calls[np.argsort(call_starts[calls], kind='stable')]
+        sorted_starts = call_starts[calls]
+        max_length = (call_ends[calls] - sorted_starts).max()
+
+        truths = np.flatnonzero(truth_seqnames == seqname)
+        lo = np.searchsorted(sorted_starts, truth_starts[truths] - max_length, side='left')
+        hi = np.searchsorted(sorted_starts, truth_ends[truths], side='right')
+        counts = np.maximum(hi - lo, 0)
+
+        truth_idx = np.repeat(truths, counts)
+        candidate = np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        call_idx = calls[candidate]
+
+        keep = call_ends[call_idx] >= truth_starts[truth_idx]
+        truth_parts.append(truth_idx[keep])
+        call_parts.append(call_idx[keep])
+
+    if not truth_parts:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    return np.concatenate(truth_parts), np.concatenate(call_parts)
+
+def sweep_orf_cutoffs(truth_df: pd.DataFrame, call_df: pd.DataFrame, cutoffs: List[float]) -> pd.DataFrame:
+    """
+    Calculate sensitivity and PPV for a grid of maximum ORF percentage cutoffs in one pass.
+
+    A truth region is found at a cutoff if any overlapping call passes it, i.e. if the
+    lowest ORF percentage among its overlapping calls is <= the cutoff. A passing call
+    overlapping no truth region is a false positive. This matches running
+    calculate_sensitivity_ppv on the calls left by filter_pseudofinder_calls.
+    """
+    orf_percentages = extract_orf_percentages(call_df).to_numpy()
+    truth_idx, call_idx = find_overlap_pairs(truth_df, call_df)
+
+    # Lowest ORF percentage among the calls overlapping each truth region (NaN if none,
+    # which sorts after every cutoff including inf)
+    truth_best = np.full(len(truth_df), np.nan)
+    np.fmin.at(truth_best, truth_idx, orf_percentages[call_idx])
+
+    call_hits_truth = np.zeros(len(call_df), dtype=bool)
+    call_hits_truth[call_idx] = True
+
+    cutoffs = np.asarray(cutoffs, dtype=float)
+    true_positives = np.searchsorted(np.sort(truth_best), cutoffs, side='right')
+    false_negatives = len(truth_df) - true_positives
+    total_calls = np.searchsorted(np.sort(orf_percentages), cutoffs, side='right')
+    false_positives = np.searchsorted(np.sort(orf_percentages[~call_hits_truth]), cutoffs, side='right')
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sensitivity = np.where(true_positives + false_negatives > 0,
+                               true_positives / (true_positives + false_negatives), 0)
+        ppv = np.where(true_positives + false_positives > 0,
+                       true_positives / (true_positives + false_positives), 0)
+
+    return pd.DataFrame({
+        'max_orf_percentage': cutoffs,
+        'Sensitivity': sensitivity,
+        'PPV': ppv,
+        'Total_Calls': total_calls
+    })
+
+def process_datasets_orf_sweep(truth_file: str, genome_accession: str, call_files: List[Dict[str, str]], cutoffs: List[float]) -> pd.DataFrame:
+    """
+    Score every call set against the truth for a grid of ORF percentage cutoffs,
+    reading the truth and each call file only once.
+    """
+    truth_df = process_truth_data(truth_file, genome_accession)
+    
+    results = []
+    for call_file in call_files:
+        is_pseudofinder = 'pseudofinder' in call_file['name'].lower()
+        call_df = read_and_filter_data(call_file['path'], genome_accession, is_pseudofinder)
+        
+        if call_file['name'].lower() == 'bakta_pseudo':
+            call_df = call_df[call_df['attribute'].notna() & call_df['attribute'].str.contains('pseudo=True')]
+        
+        # Unfiltered first, then each cutoff for Pseudofinder call sets
+        grid = [np.inf] + (list(cutoffs) if is_pseudofinder else [])
+        sweep = sweep_orf_cutoffs(truth_df, call_df, grid)
+        sweep.insert(0, 'Dataset', [call_file['name'] if np.isinf(cutoff) else f"{call_file['name']} (ORF≤{cutoff}%)"
+                                    for cutoff in grid])
+        sweep['max_orf_percentage'] = sweep['max_orf_percentage'].replace(np.inf, np.nan)
+        results.append(sweep)
+    
+    return pd.concat(results, ignore_index=True)
+
 def main():
     parser = argparse.ArgumentParser(description="Compare pseudogene calls against a truth set.")
     parser.add_argument("--truth", required=True, help="Path to the truth Excel file")
@@ -262,6 +382,9 @@ def main():
     parser.add_argument("--output_dir", required=True, help="Directory to save output files")
     parser.add_argument("--max_orf_percentage", type=float, default=100.0, 
                       help="Maximum ORF percentage to include for pseudofinder calls (default: 100.0)")
+    parser.add_argument("--orf_grid", type=float, nargs='+',
+                      help="Score pseudofinder calls at each of these maximum ORF percentages in one pass, "
+                           "instead of the unfiltered/--max_orf_percentage comparison")
     
     args = parser.parse_args()
     
@@ -274,6 +397,16 @@ def main():
     print("Processing files...")
     print(call_files)
 
+    if args.orf_grid:
+        print(f"\nRunning ORF percentage sweep over {len(args.orf_grid)} cutoffs...")
+        sweep_results = process_datasets_orf_sweep(args.truth, args.genome_accession, call_files, args.orf_grid)
+        print(sweep_results)
+        
+        os.makedirs(args.output_dir, exist_ok=True)
+        sweep_results['genome_accession'] = args.genome_accession
+        sweep_results.to_csv(os.path.join(args.output_dir, f'{args.genome_accession}_orf_sweep_results.csv'), index=False)
+        return
+
     # Run analysis without filtering
     print("\nRunning analysis without ORF filtering...")
     unfiltered_results, unfiltered_calls = process_datasets(args.truth, args.genome_accession, call_files)
@@ -0,0 +1,124 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+
+OUTPUT_FORMATS = ['excel', 'parquet', 'both']
+
+# Preferred sheet when a result has several, in order
+RESULT_SHEETS = ['Deduplicated_Data', 'Complete_Data']
+
+
+def parquet_sheet_path(output, sheet_name):
+    """Return the Parquet path used for one sheet of an Excel output path"""
+    base, ext = os.path.splitext(str(output))
+    if ext.lower() not in ('.xlsx', '.xls'):
+        base = str(output)
+    return f'{base}.{sheet_name}.parquet'
+
+
+def parquet_safe(df):
+    """
+    Return df with mixed-type object columns (e.g. free-text Nuccio columns holding
+    both numbers and strings) converted to strings, which Parquet can store.
+    Missing values are kept as missing.
+    """
+    mixed = [col for col in df.columns
+             if df[col].dtype == object and
+             pd.api.types.infer_dtype(df[col], skipna=True) in ('mixed', 'mixed-integer')]
+    if not mixed:
+        return df
+    df = df.copy()
+    for col in mixed:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def write_sheets(sheets, output, output_format='excel'):
+    """
+    Write named tables as sheets of an Excel workbook and/or one Parquet file per sheet.
+
+    Args:
+        sheets: Dict of sheet name to DataFrame, in sheet order
+        output: Excel output path; Parquet files are written next to it as
+            <output without .xlsx>.<sheet name>.parquet
+        output_format: 'excel', 'parquet' or 'both'; mixed-type columns are
+            written to Parquet as strings (see parquet_safe)
+
+    Returns:
+        list: Paths written
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+
+    written = []
+    if output_format in ('excel', 'both'):
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            for sheet_name, df in sheets.items():
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+        written.append(str(output))
+
+    if output_format in ('parquet', 'both'):
+        for sheet_name, df in sheets.items():
+            path = parquet_sheet_path(output, sheet_name)
+            parquet_safe(df).to_parquet(path, index=False)
+            written.append(path)
+
+    return written
+
+
+def read_sheets(output, sheet_names, output_format='excel'):
+    """Read back named sheets written by write_sheets, preferring Parquet when both exist"""
+    if output_format in ('parquet', 'both'):
+        return {sheet_name: pd.read_parquet(parquet_sheet_path(output, sheet_name))
+                for sheet_name in sheet_names}
+    return pd.read_excel(output, sheet_name=list(sheet_names))
+
+
+def find_result_files(input_dir):
+    """
+    Find one result file per sample in input_dir.
+
+    Parquet results are preferred over Excel ones with the same name, and of a
+    sample's Parquet sheets the Deduplicated_Data one is preferred. Excel lock
+    files (~$...) are skipped.
+
+    Returns:
+        list: Paths of Parquet sheet files and Excel workbooks
+    """
+    input_dir = Path(input_dir)
+
+    parquet_sheets = {}
+    for path in sorted(input_dir.glob('*.parquet')):
+        base, _, sheet_name = path.name[:-len('.parquet')].rpartition('.')
+        parquet_sheets.setdefault(base, {})[sheet_name] = path
+
+    results = []
+    for base, sheets in parquet_sheets.items():
+        preferred = [sheets[name] for name in RESULT_SHEETS if name in sheets]
+        results.append(preferred[0] if preferred else next(iter(sheets.values())))
+
+    for path in sorted(input_dir.glob('*.xlsx')):
+        if path.name.startswith('~') or path.name[:-len('.xlsx')] in parquet_sheets:
+            continue
+        results.append(path)
+
+    return results
+
+
+def read_result_table(path):
+    """
+    Read a result table from a Parquet sheet file or an Excel workbook.
+
+    For Excel, the Deduplicated_Data sheet is read when present, else the first sheet.
+    """
+    path = Path(path)
+    if path.suffix == '.parquet':
+        return pd.read_parquet(path)
+
+    try:
+        return pd.read_excel(path, sheet_name='Deduplicated_Data')
+    except ValueError as e:
+        if "Worksheet named 'Deduplicated_Data' not found" in str(e):
+            return pd.read_excel(path)
+        raise
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+
+class IntervalIndex:
+    """
+    Per-contig arrays of intervals sorted by start, built once per call set.
+
+    Overlapping intervals are found by binary search on the sorted starts.
+    Intervals are closed, so a 1 bp touch counts as an overlap.
+    """
+
+    def __init__(self, seqnames, starts, ends, contigs=None):
+        """
+        Index intervals given by seqname, start and end arrays. With contigs,
+        seqnames holds integer codes into contigs instead of names, so intervals
+        are grouped without building an array of name strings.
+        """
+        if contigs is None:
+            seqnames = np.asarray(seqnames, dtype=object)
+            groups = [(seqname, seqnames == seqname) for seqname in pd.unique(seqnames)]
+        else:
+            codes = np.asarray(seqnames)
+            groups = [(contigs[code], codes == code) for code in np.unique(codes)]
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+
+        self._size = len(starts)
+        self.starts = starts
+        self.ends = ends
+        self._contigs = {}
+        for seqname, mask in groups:
+            positions = np.flatnonzero(mask)
+            order = positions[np.argsort(starts[positions], kind='stable')]
+            self._contigs[seqname] = {
+                'sorted_starts': starts[order],
+                # Intervals in start order, for enumerating overlapping pairs
+                'order': order,
+                'ends_by_start': ends[order],
+                'max_length': int((ends[positions] - starts[positions]).max()),
+            }
+
+    @classmethod
+    def from_regions(cls, regions):
+        """Build an index from a coords_utils.RegionTable, grouping by its contig codes"""
+        return cls(regions.codes, regions.starts, regions.ends, contigs=regions.contigs)
+
+    def __len__(self):
+        return self._size
+
+    def overlap_pairs(self, seqnames, starts, ends):
+        """
+        Return every (query, interval) pair that overlaps.
+
+        Candidates for a query are the intervals starting in
+        [start - longest interval length, end], found by binary search; those
+        ending before the query start are then dropped with array arithmetic.
+
+        Returns:
+            tuple: (query positions, interval positions), as int arrays indexing
+            the query arrays and the intervals the index was built from
+        """
+        seqnames = np.asarray(seqnames, dtype=object)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+
+        query_parts, interval_parts = [], []
+        for seqname in pd.unique(seqnames):
+            contig = self._contigs.get(seqname)
+            if contig is None:
+                continue
+            queries = np.flatnonzero(seqnames == seqname)
+            lo = np.searchsorted(contig['sorted_starts'], starts[queries] - contig['max_length'], side='left')
+            hi = np.searchsorted(contig['sorted_starts'], ends[queries], side='right')
+            counts = np.maximum(hi - lo, 0)
+
+            # Expand each query's candidate range [lo, hi) into explicit positions
+            query_idx = np.repeat(queries, counts)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            candidate = np.repeat(lo, counts) + offsets
+
+            keep = contig['ends_by_start'][candidate] >= starts[query_idx]
+            query_parts.append(query_idx[keep])
+            interval_parts.append(contig['order'][candidate[keep]])
+
+        if not query_parts:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        return np.concatenate(query_parts), np.concatenate(interval_parts)
+
+    def overlap_lengths(self, seqnames, starts, ends):
+        """
+        Return every overlapping (query, interval) pair with its overlap length in bp.
+
+        Returns:
+            tuple: (query positions, interval positions, overlap lengths), as from
+            overlap_pairs; a 1 bp touch has length 1
+        """
+        query_pos, interval_pos = self.overlap_pairs(seqnames, starts, ends)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        lengths = (np.minimum(ends[query_pos], self.ends[interval_pos]) -
+                   np.maximum(starts[query_pos], self.starts[interval_pos]) + 1)
+        return query_pos, interval_pos, lengths
@@ -0,0 +1,89 @@
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from cache_utils import file_lock
+
+
+def _peak_rss_mb(who):
+    """Return the peak resident set size in MB (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class StageProfiler:
+    """
+    Record wall time, CPU time, peak memory and row counts of named stages as JSON lines.
+
+    CPU time includes finished child processes, so DIAMOND runs are counted. Peak
+    RSS is the high-water mark of the process (and of its largest child) when the
+    stage ends. Lines are appended under a lock, so batch workers can share one
+    file. A profiler created without a path records nothing.
+
+    Args:
+        path: JSON lines file to append to, '-' for stderr, or None to disable
+        script: Name of the script, included in every line
+        **context: Extra fields for every line, e.g. gcf
+    """
+
+    def __init__(self, path=None, script=None, **context):
+        self.path = path
+        self.context = {key: value for key, value in dict(context, script=script).items()
+                        if value is not None}
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def start(self):
+        """Return a snapshot to pass to record() when the stage ends"""
+        if not self.enabled:
+            return None
+        times = os.times()
+        return time.perf_counter(), times.user + times.system, times.children_user + times.children_system
+
+    def record(self, stage, snapshot, rows=None, **fields):
+        """Write one JSON line for a stage started with start()"""
+        if not self.enabled:
+            return
+        wall, cpu, children_cpu = snapshot
+        times = os.times()
+        line = dict(self.context, **fields)
+        line.update({
+            'time': datetime.now(timezone.utc).isoformat(),
+            'pid': os.getpid(),
+            'stage': stage,
+            'wall_seconds': round(time.perf_counter() - wall, 6),
+            'cpu_seconds': round(times.user + times.system - cpu, 6),
+            'children_cpu_seconds': round(times.children_user + times.children_system - children_cpu, 6),
+            'peak_rss_mb': round(_peak_rss_mb(resource.RUSAGE_SELF), 1),
+            'children_peak_rss_mb': round(_peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+            'rows': None if rows is None else int(rows),
+        })
+        text = json.dumps(line) + '\n'
+
+        if self.path == '-':
+            sys.stderr.write(text)
+            return
+        with file_lock(f'{self.path}.lock'):
+            with open(self.path, 'a') as handle:
+                handle.write(text)
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """
+        Profile the enclosed block as one stage. The block may set a 'rows' entry
+        (or any other field) on the yielded dict.
+        """
+        info = dict(fields)
+        snapshot = self.start()
+        yield info
+        self.record(name, snapshot, **info)
+
+
+# Shared disabled profiler for functions called without one
+NULL_PROFILER = StageProfiler()
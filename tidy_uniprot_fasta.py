@@ -0,0 +1,111 @@
+import argparse
+import gzip
+import hashlib
+import sys
+
+# Wrap sequences at this many residues, as Biopython's FASTA writer does
+LINE_WIDTH = 60
+
+def open_text(path, mode='r'):
+    """Open a plain or gzipped text file; '-' is stdin/stdout"""
+    if path == '-':
+        return sys.stdin if 'r' in mode else sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+def read_fasta(handle):
+    """Yield (header, sequence) for each record, one record in memory at a time"""
+    header, chunks = None, []
+    for line in handle:
+        line = line.rstrip('\r\n')
+        if line.startswith('>'):
+            if header is not None:
+                yield header, ''.join(chunks)
+            header, chunks = line[1:], []
+        elif header is not None:
+            chunks.append(line.strip())
+    if header is not None:
+        yield header, ''.join(chunks)
+
+def simplify_id(header):
+    """Return the record ID, reduced to the accession for UniProt-style IDs (sp|P12345|NAME_SALTY -> P12345)"""
+    record_id = header.split(maxsplit=1)[0] if header.strip() else ''
+    if '|' in record_id:
+        return record_id.split('|')[1]
+    return record_id
+
+def sequence_digest(sequence):
+    """Return a 16-byte digest of a sequence, compared instead of the sequence itself"""
+    return hashlib.blake2b(sequence.encode(), digest_size=16).digest()
+
+def write_record(out, record_id, sequence):
+    out.write(f">{record_id}\n")
+    for i in range(0, len(sequence), LINE_WIDTH):
+        out.write(sequence[i:i + LINE_WIDTH] + '\n')
+
+def tidy_fasta(records, out):
+    """
+    Write records with simplified IDs, dropping exact (ID, sequence) duplicates.
+
+    Each record is checked against a digest of the first sequence seen for its ID,
+    so the cost per record does not grow with the number of earlier records. IDs
+    seen with differing sequences keep one copy of each variant and are reported.
+
+    Returns:
+        tuple: (records read, records written, dict of conflicting ID to number of
+                distinct sequences)
+    """
+    first_digest = {}
+    variants = {}
+    n_read = n_written = 0
+
+    for header, sequence in records:
+        n_read += 1
+        record_id = simplify_id(header)
+        digest = sequence_digest(sequence)
+
+        seen = first_digest.get(record_id)
+        if seen is None:
+            first_digest[record_id] = digest
+        elif seen == digest:
+            continue  # Skip duplicate sequence
+        else:
+            id_variants = variants.setdefault(record_id, {seen})
+            if digest in id_variants:
+                continue
+            id_variants.add(digest)
+            if len(id_variants) == 2:
+                print(f"Warning: ID {record_id} has differing sequences.", file=sys.stderr)
+
+        write_record(out, record_id, sequence)
+        n_written += 1
+
+    return n_read, n_written, {record_id: len(digests) for record_id, digests in variants.items()}
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Simplify UniProt FASTA IDs and drop duplicate (ID, sequence) records before '
+                    'building a DIAMOND database')
+    parser.add_argument('--input', required=True, help='Input FASTA file (.gz allowed, "-" for stdin)')
+    parser.add_argument('--output', required=True, help='Output FASTA file (.gz allowed, "-" for stdout)')
+    parser.add_argument('--conflicts', help='Write IDs that have differing sequences to this TSV file')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    with open_text(args.input) as infile, open_text(args.output, 'w') as outfile:
+        n_read, n_written, conflicts = tidy_fasta(read_fasta(infile), outfile)
+
+    if args.conflicts:
+        with open(args.conflicts, 'w') as handle:
+            handle.write('id\tdistinct_sequences\n')
+            for record_id, n_sequences in conflicts.items():
+                handle.write(f"{record_id}\t{n_sequences}\n")
+
+    print(f"Read {n_read} records, wrote {n_written}, dropped {n_read - n_written} duplicates; "
+          f"{len(conflicts)} IDs have differing sequences", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()